@@ -1,3 +1,4 @@
+import operator
 from typing import TypedDict, Annotated
 from langgraph.graph.message import add_messages
 from langchain_core.messages import BaseMessage
@@ -7,3 +8,7 @@ from app.models.PlayerCharacter import PlayerCharacter
 class GameState(TypedDict, total=False):
     players: list[PlayerCharacter]
     messages: Annotated[list[BaseMessage], add_messages]
+    # Rolling summary of the messages compacted out of `messages`
+    summary: str
+    # Running token total of `messages` and `summary`, nodes return the delta for what they add or remove
+    token_count: Annotated[int, operator.add]
@@ -35,7 +35,57 @@ class LoadAppConfig:
         self.phandelverstory_rag_collection_name = app_config["rag"]["collection_name_phandelverstory"]
         self.rag_k_phandelverstory = app_config["rag"]["k_phandelverstory"]
 
+        # Checkpoint store
+        self.checkpoint_db_path = str(here(app_config["checkpoint"]["path"]))
+        self.checkpoint_readers = app_config["checkpoint"]["readers"]
+        self.checkpoint_synchronous = app_config["checkpoint"]["synchronous"]
+        self.checkpoint_mmap_size = app_config["checkpoint"]["mmap_size"]
+        self.checkpoint_cache_size = app_config["checkpoint"]["cache_size"]
+        self.checkpoint_busy_timeout_ms = app_config["checkpoint"]["busy_timeout_ms"]
+        self.checkpoint_durability = app_config["checkpoint"]["durability"]
+        self.checkpoint_message_log_cache_threads = app_config["checkpoint"]["message_log_cache_threads"]
+        self.checkpoint_compression_enabled = app_config["checkpoint"]["compression"]["enabled"]
+        self.checkpoint_compression_level = app_config["checkpoint"]["compression"]["level"]
+        self.checkpoint_compression_min_size = app_config["checkpoint"]["compression"]["min_size"]
+        self.checkpoint_compression_dictionary_size = app_config["checkpoint"]["compression"]["dictionary_size"]
+        self.checkpoint_compression_train_samples = app_config["checkpoint"]["compression"]["train_samples"]
+        self.checkpoint_retention_enabled = app_config["checkpoint"]["retention"]["enabled"]
+        self.checkpoint_retention_keep_last = app_config["checkpoint"]["retention"]["keep_last"]
+        self.checkpoint_retention_keep_turns = app_config["checkpoint"]["retention"]["keep_turns"]
+        self.checkpoint_retention_batch_size = app_config["checkpoint"]["retention"]["batch_size"]
+        self.checkpoint_retention_vacuum_pages = app_config["checkpoint"]["retention"]["vacuum_pages"]
+        self.checkpoint_retention_interval_seconds = app_config["checkpoint"]["retention"]["interval_seconds"]
+        self.checkpoint_retention_convert_auto_vacuum = app_config["checkpoint"]["retention"]["convert_auto_vacuum"]
+
+        # Embedding cache
+        self.embedding_cache_path = str(here(app_config["embedding_cache"]["path"]))
+        self.embedding_cache_max_memory_entries = app_config["embedding_cache"]["max_memory_entries"]
+        self.embedding_cache_max_disk_entries = app_config["embedding_cache"]["max_disk_entries"]
+
+        # Tool execution
+        self.tool_timeout_seconds = app_config["tools"]["timeout_seconds"]
+        self.tool_timeouts = app_config["tools"]["timeouts"] or {}
+
+        # Websocket
+        self.ws_default_room = app_config["websocket"]["default_room"]
+        self.ws_stream_tokens = app_config["websocket"]["stream_tokens"]
+        self.ws_turn_deadline_seconds = app_config["websocket"]["turn_deadline_seconds"]
+        self.ws_send_queue_size = app_config["websocket"]["send_queue_size"]
+        self.ws_send_timeout_seconds = app_config["websocket"]["send_timeout_seconds"]
+        self.ws_broadcast_backend = app_config["websocket"]["broadcast"]["backend"]
+        self.ws_broadcast_redis_url = app_config["websocket"]["broadcast"]["redis_url"]
+        self.ws_broadcast_reconnect_seconds = app_config["websocket"]["broadcast"]["reconnect_seconds"]
+        self.ws_broadcast_lease_seconds = app_config["websocket"]["broadcast"]["lease_seconds"]
+        self.ws_replay_size = app_config["websocket"]["replay"]["size"]
+        self.ws_replay_idle_rooms = app_config["websocket"]["replay"]["idle_rooms"]
+        self.ws_rate_limit_connection = app_config["websocket"]["rate_limit"]["connection"]
+        self.ws_rate_limit_room = app_config["websocket"]["rate_limit"]["room"]
 
         # Graph configs
         self.thread_id = str(
             app_config["graph_configs"]["thread_id"])
+        self.max_concurrent_llm_calls = app_config["graph_configs"]["max_concurrent_llm_calls"]
+
+        # Sessions
+        self.max_active_sessions = app_config["sessions"]["max_active"]
+        self.session_ttl_seconds = app_config["sessions"]["ttl_seconds"]
@@ -1,27 +1,143 @@
+import json
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.config.LoadAppConfig import LoadAppConfig
 from app.models.ChatRequest import ChatRequest
+from app.services.BroadcastBackend import WORKER_ID
 from app.services.ChatService import openai_service
+from app.services.EventBus import event_bus, room_owner_key, room_topic
 from app.services.WebsocketService import ws_service
 
+CFG = LoadAppConfig()
+
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def publish_reply(session_id: str, reply: str):
+    """Shows a Game Master reply produced over REST to the websocket room playing the same game."""
+    game_master_respone = {
+        "id": "GAME_MASTER",
+        "user": "GAME_MASTER",
+        "type": "CHAT",
+        "message": reply
+    }
+    event_bus.publish(room_topic(session_id), game_master_respone)
+
+
+def lease_ms() -> int:
+    return int(CFG.ws_broadcast_lease_seconds * 1000)
+
+
+async def claim_room(session_id: str):
+    """Makes this worker the only writer of the game's thread for one REST turn.
+
+    The lease is the one websocket rooms take to play their turns, so a game is
+    never written by two workers at once. Raises 409 while another worker holds it.
+    Run the turn under `hold_room` so the lease outlasts it.
+    """
+    try:
+        claimed = await event_bus.backend.claim(room_owner_key(session_id), WORKER_ID, lease_ms())
+    except Exception as e:
+        print(f"Room {session_id} ownership error: {e}")
+        raise HTTPException(status_code=503, detail="Room ownership unavailable")
+    if not claimed:
+        raise HTTPException(status_code=409, detail=f"Game {session_id} is being played on another worker")
+
+
+def hold_room(session_id: str):
+    """Keeps renewing the claimed lease of a game while its turn runs."""
+    return event_bus.hold_lease(room_owner_key(session_id), WORKER_ID, lease_ms())
+
+
+async def release_room(session_id: str):
+    # A websocket room on this worker keeps the lease for its next turns
+    if session_id in ws_service.rooms:
+        return
+    try:
+        await event_bus.backend.release(room_owner_key(session_id), WORKER_ID)
+    except Exception as e:
+        print(f"Room {session_id} ownership error: {e}")
+
+
+def sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def stream_events(message: str, session_id: str):
+    """Formats the graph stream of one turn as Server-Sent Events.
+
+    The room lease is claimed here, once the body is being sent, so a client gone
+    before streaming starts never leaves it held. A refused claim is sent as an
+    {"event": "error", "status": 409 | 503} event.
+    """
+    try:
+        await claim_room(session_id)
+    except HTTPException as e:
+        yield sse({"event": "error", "status": e.status_code, "data": e.detail})
+        return
+    try:
+        reply = ""
+        async with hold_room(session_id):
+            async for event in openai_service.stream_chat(message, session_id):
+                if event["event"] == "message":
+                    reply = event["data"]
+                yield sse(event)
+
+        # Send message to the websocket room
+        publish_reply(session_id, reply)
+    finally:
+        await release_room(session_id)
+
+
 @router.post("/message")
 async def send_message(request: ChatRequest):
     if not request.message:
         raise HTTPException(status_code=400, detail="Missing 'message'")
-    reply = await openai_service.chat(request.message, "user-123")
+    await claim_room(request.session_id)
+    try:
+        async with hold_room(request.session_id):
+            reply = await openai_service.chat(request.message, request.session_id)
+    finally:
+        await release_room(request.session_id)
 
-    # Send message to server
-    await ws_service.client_send_message(reply)
+    # Send message to the websocket room
+    publish_reply(request.session_id, reply)
         
     return {"reply": reply}
 
 
+@router.post("/message/stream")
+async def send_message_stream(request: ChatRequest):
+    if not request.message:
+        raise HTTPException(status_code=400, detail="Missing 'message'")
+    return StreamingResponse(
+        stream_events(request.message, request.session_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+
 @router.post("/start")
-async def start_game():
-    reply = await openai_service.chat("Bắt đầu trò chơi", "user-123")
+async def start_game(session_id: str = "user-123"):
+    await claim_room(session_id)
+    try:
+        async with hold_room(session_id):
+            reply = await openai_service.chat("Bắt đầu trò chơi", session_id)
+    finally:
+        await release_room(session_id)
 
-    # Send message to server
-    await ws_service.client_send_message(reply)
+    # Send message to the websocket room
+    publish_reply(session_id, reply)
 
     return {"reply": reply}
+
+
+@router.post("/start/stream")
+async def start_game_stream(session_id: str = "user-123"):
+    return StreamingResponse(
+        stream_events("Bắt đầu trò chơi", session_id),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
@@ -1,19 +1,32 @@
+import asyncio
 from contextlib import asynccontextmanager
 from sqlite3 import OperationalError
 
 import uvicorn
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from app.config.LoadAppConfig import LoadAppConfig
 from app.controllers import ChatController
 from app.services.ChatService import openai_service
 from app.services.SqliteService import sqlite_service
 from app.services.WebsocketService import ws_service
+from app.services.VectorStoreRegistry import vectorstore_registry
+from app.services.EmbeddingCache import embedding_cache
+from app.services.CheckpointRetention import checkpoint_retention
+from app.services.EventBus import event_bus
+
+CFG = LoadAppConfig()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup ---
     try:
         await sqlite_service.init()
+        await openai_service.init()
+        await event_bus.start()
+        await asyncio.to_thread(vectorstore_registry.init)
+        if CFG.checkpoint_retention_enabled:
+            checkpoint_retention.start()
         if openai_service.dnd_graph:
             print("Game master initialized")
     except OperationalError as e:
@@ -22,6 +35,11 @@ async def lifespan(app: FastAPI):
     yield  # <--- App runs here
 
     # --- Shutdown ---
+    await checkpoint_retention.stop()
+    await event_bus.stop()
+    print(f"Embedding cache stats: {embedding_cache.stats()}")
+    embedding_cache.close()
+    await sqlite_service.close()
     print("🛑 App closed")
 
 
@@ -43,8 +61,8 @@ def root():
     return {"message": "DnD AI GM is running"}
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    client_obj = await ws_service.handle_connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, room: str = CFG.ws_default_room):
+    client_obj = await ws_service.handle_connect(websocket, room)
     await ws_service.handle_receive(websocket, client_obj, openai_service)
 
 if __name__ == "__main__":
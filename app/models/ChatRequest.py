@@ -3,3 +3,4 @@ from pydantic import BaseModel
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: str = "user-123"
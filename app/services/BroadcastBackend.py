@@ -0,0 +1,253 @@
+import asyncio
+import os
+import socket
+import time
+from collections.abc import Callable
+from urllib.parse import urlparse
+import orjson
+
+# Unique per process, prefixes connection ids and marks room ownership
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+# Lease scripts, the owner check and the update must be one atomic step: between a GET
+# and a later PEXPIRE or DEL the lease can expire and be taken by another worker
+CLAIM_SCRIPT = """
+local holder = redis.call('GET', KEYS[1])
+if holder and holder ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class InMemoryBroadcastBackend:
+    """Broadcast backend for a single process, events go straight back to the local bus.
+
+    Attributes:
+        dispatch (Callable): Local delivery of the event bus, set by the bus.
+    """
+
+    def __init__(self) -> None:
+        self.dispatch: Callable[[str, dict], None] | None = None
+        self.leases: dict[str, tuple[str, float]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def subscribe(self, topic: str) -> None:
+        pass
+
+    def unsubscribe(self, topic: str) -> None:
+        pass
+
+    def publish(self, topic: str, event: dict) -> None:
+        if self.dispatch is not None:
+            self.dispatch(topic, event)
+
+    async def claim(self, key: str, owner: str, ttl_ms: int) -> bool:
+        """Takes or extends the lease on a key, False while another owner holds it."""
+        holder = self.leases.get(key)
+        now = time.monotonic()
+        if holder is not None and holder[0] != owner and holder[1] > now:
+            return False
+        self.leases[key] = (owner, now + ttl_ms / 1000)
+        return True
+
+    async def release(self, key: str, owner: str) -> None:
+        holder = self.leases.get(key)
+        if holder is not None and holder[0] == owner:
+            del self.leases[key]
+
+
+class RespError(Exception):
+    pass
+
+
+class RespConnection:
+    """Bare Redis protocol (RESP2) connection, enough for PUBLISH, SUBSCRIBE and leases."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, url: str) -> "RespConnection":
+        parsed = urlparse(url)
+        reader, writer = await asyncio.open_connection(parsed.hostname or "localhost", parsed.port or 6379)
+        conn = cls(reader, writer)
+        if parsed.password:
+            conn.write("AUTH", *([parsed.username] if parsed.username else []), parsed.password)
+            await conn.read()
+        database = parsed.path.lstrip("/")
+        if database and database != "0":
+            conn.write("SELECT", database)
+            await conn.read()
+        return conn
+
+    def write(self, *args) -> None:
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.writer.write(b"".join(parts))
+
+    async def read(self):
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise RespError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self.read() for _ in range(length)]
+        raise RespError(f"Unexpected reply: {line!r}")
+
+    async def command(self, *args):
+        self.write(*args)
+        await self.writer.drain()
+        return await self.read()
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+
+class RedisBroadcastBackend:
+    """Broadcast backend sharing room topics between workers through a Redis-protocol server.
+
+    Publishing only queues the event, a sender task pipelines the queued PUBLISH
+    commands on one connection. A second connection holds the subscriptions of the
+    topics this worker has rooms for and hands incoming events to the local bus.
+    Room ownership uses leases taken, extended and released by Lua scripts that
+    compare the owner and update the key atomically.
+
+    Attributes:
+        url (str): redis://[user:password@]host:port/db of the server.
+        reconnect_seconds (float): Pause before reconnecting after a connection error.
+        dispatch (Callable): Local delivery of the event bus, set by the bus.
+    """
+
+    def __init__(self, url: str, reconnect_seconds: float = 1.0) -> None:
+        self.url = url
+        self.reconnect_seconds = reconnect_seconds
+        self.dispatch: Callable[[str, dict], None] | None = None
+        self.topics: set[str] = set()
+        self.outbox: asyncio.Queue[tuple] = asyncio.Queue()
+        self.tasks: list[asyncio.Task] = []
+        self.sub_conn: RespConnection | None = None
+        self.cmd_conn: RespConnection | None = None
+        self.cmd_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        self.tasks = [asyncio.create_task(self.send_loop()), asyncio.create_task(self.receive_loop())]
+
+    async def close(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for conn in (self.sub_conn, self.cmd_conn):
+            if conn is not None:
+                await conn.close()
+
+    def subscribe(self, topic: str) -> None:
+        self.topics.add(topic)
+        if self.sub_conn is not None:
+            self.sub_conn.write("SUBSCRIBE", topic)
+
+    def unsubscribe(self, topic: str) -> None:
+        self.topics.discard(topic)
+        if self.sub_conn is not None:
+            self.sub_conn.write("UNSUBSCRIBE", topic)
+
+    def publish(self, topic: str, event: dict) -> None:
+        self.outbox.put_nowait(("PUBLISH", topic, orjson.dumps(event)))
+
+    async def command(self, *args):
+        async with self.cmd_lock:
+            if self.cmd_conn is None:
+                self.cmd_conn = await RespConnection.open(self.url)
+            try:
+                return await self.cmd_conn.command(*args)
+            except (ConnectionError, OSError):
+                await self.cmd_conn.close()
+                self.cmd_conn = None
+                raise
+
+    async def send_loop(self) -> None:
+        while True:
+            batch = [await self.outbox.get()]
+            while not self.outbox.empty():
+                batch.append(self.outbox.get_nowait())
+            try:
+                async with self.cmd_lock:
+                    if self.cmd_conn is None:
+                        self.cmd_conn = await RespConnection.open(self.url)
+                    # One round trip for everything published since the last flush
+                    for args in batch:
+                        self.cmd_conn.write(*args)
+                    await self.cmd_conn.writer.drain()
+                    for _ in batch:
+                        try:
+                            await self.cmd_conn.read()
+                        except RespError as e:
+                            print(f"Broadcast publish rejected: {e}")
+            except (ConnectionError, OSError) as e:
+                print(f"Broadcast publish error, {len(batch)} events lost: {e}")
+                if self.cmd_conn is not None:
+                    await self.cmd_conn.close()
+                    self.cmd_conn = None
+                await asyncio.sleep(self.reconnect_seconds)
+
+    async def receive_loop(self) -> None:
+        while True:
+            try:
+                self.sub_conn = await RespConnection.open(self.url)
+                for topic in self.topics:
+                    self.sub_conn.write("SUBSCRIBE", topic)
+                await self.sub_conn.writer.drain()
+                while True:
+                    reply = await self.sub_conn.read()
+                    if isinstance(reply, list) and reply and reply[0] == b"message":
+                        topic, data = reply[1].decode(), reply[2]
+                        self.dispatch(topic, orjson.loads(data))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Broadcast subscription error: {e}")
+                if self.sub_conn is not None:
+                    await self.sub_conn.close()
+                self.sub_conn = None
+                await asyncio.sleep(self.reconnect_seconds)
+
+    async def claim(self, key: str, owner: str, ttl_ms: int) -> bool:
+        """Takes or extends the lease on a key, False while another owner holds it."""
+        return await self.command("EVAL", CLAIM_SCRIPT, 1, key, owner, ttl_ms) == 1
+
+    async def release(self, key: str, owner: str) -> None:
+        await self.command("EVAL", RELEASE_SCRIPT, 1, key, owner)
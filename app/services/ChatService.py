@@ -1,16 +1,20 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from langchain_core.output_parsers.openai_tools import PydanticToolsParser
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
+from langchain_core.messages import SystemMessage, HumanMessage
 from pydantic import SecretStr
 
 from dotenv import load_dotenv
-from typing import List
+from typing import AsyncIterator, List
 from app.DTOs.GameState import GameState
 from app.models.PlayerCharacter import PlayerCharacter
 from app.config.LoadAppConfig import LoadAppConfig
 from app.services.DnDGraph import build_graph
+from app.services.EmbeddingCache import CachedEmbeddings, embedding_cache
+from app.services.SessionManager import Session, SessionManager
+from app.services.SummarizerNode import TOKEN_LIMIT, compact_history, count_messages_tokens
 
 CFG = LoadAppConfig()
 
@@ -30,12 +34,16 @@ class ChatService:
         LLM_API_KEY: str | None = llm_api_key or os.getenv("AZURE_OPENAI_API_KEY")
         LLM_MODEL_NAME: str | None = llm_model_name or os.getenv("AZURE_DEPLOYMENT_NAME")
 
-        self.embedding_model = OpenAIEmbeddings(
+        self.embedding_model = CachedEmbeddings(
+            OpenAIEmbeddings(
+                model=(EMBEDDING_MODEL_NAME if EMBEDDING_MODEL_NAME is not None else ""),
+                base_url=BASE_URL,
+                api_key=SecretStr(
+                    EMBEDDING_API_KEY if EMBEDDING_API_KEY is not None else ""
+                )
+            ),
             model=(EMBEDDING_MODEL_NAME if EMBEDDING_MODEL_NAME is not None else ""),
-            base_url=BASE_URL,
-            api_key=SecretStr(
-                EMBEDDING_API_KEY if EMBEDDING_API_KEY is not None else ""
-            )
+            cache=embedding_cache,
         )
         
         self.llm_model = ChatOpenAI(
@@ -46,9 +54,12 @@ class ChatService:
             timeout=300,
         ) 
 
-        message = SystemMessage(CFG.init_system_message)
-        self.game_state = GameState(messages=[message])
-        self.dnd_graph = build_graph()
+        # Compiled in init(), once the checkpointer is open
+        self.dnd_graph = None
+        self.sessions = SessionManager(
+            max_sessions=CFG.max_active_sessions,
+            ttl_seconds=CFG.session_ttl_seconds,
+        )
 
         # Character data extraction chan
         self.llm_player_extractor = self.llm_model.bind_tools(
@@ -57,6 +68,11 @@ class ChatService:
 
     # ------------------------------Methods---------------------------------
 
+    async def init(self):
+        if self.dnd_graph:  # avoid re-init
+            return
+        self.dnd_graph = build_graph()
+
     async def init_character_info(self, state: GameState) -> list[PlayerCharacter]:
         players: list[PlayerCharacter] = state.get("players") or []
         if players:
@@ -66,28 +82,111 @@ class ChatService:
         return await self.llm_player_extractor.ainvoke(character_data)
    
     async def chat(self, input_msg: str, session_id: str) -> str:
-        cfg = {"configurable": {"thread_id": session_id}}
-        
-        if not self.game_state.get("players"):
-            await self.init_character_info(self.game_state)
-        
-        self.game_state.get("messages").append(HumanMessage(input_msg))
-        
-        events = self.dnd_graph.astream(
-            {"messages": self.game_state.get('messages')}, config=cfg, stream_mode="values"
-        )
         response_content = ""
-        async for event in events:
-            response_content = event["messages"][-1].content
-            event["messages"][-1].pretty_print()
-
-        # Update conversation with the new assistant message
-        self.game_state.get("messages").append(AIMessage(response_content))
+        async for event in self.stream_chat(input_msg, session_id):
+            if event["event"] == "message":
+                response_content = event["data"]
         return response_content
 
+    async def stream_chat(self, input_msg: str, session_id: str) -> AsyncIterator[dict]:
+        """
+        Run one turn of the graph, yielding Game Master tokens as they are generated.
+
+        Args:
+            input_msg: The players' combined input for this turn
+            session_id: LangGraph thread id of the game
+
+        Yields:
+            {"event": "token", "id": message id, "data": text chunk} for every narrative token,
+            {"event": "tool_start" | "tool_end", "id": tool call id, "name": tool name, ...} around tool calls,
+            then a single {"event": "message", "data": full reply} once the turn is over
+        """
+        cfg = {
+            "configurable": {"thread_id": session_id},
+            # Saved in the checkpoint metadata, retention reads it to find turn boundaries
+            "metadata": {"durability": CFG.checkpoint_durability},
+        }
+        session = await self.sessions.get(session_id, self.dnd_graph)
+
+        async with session.lock:
+            if session.stale:
+                await self.sessions.refresh(session_id, session, self.dnd_graph)
+            game_state = session.state
+            # Only the new turn goes in, the checkpointed thread already holds the history
+            new_messages = [HumanMessage(input_msg)]
+            if not session.started:
+                new_messages.insert(0, SystemMessage(CFG.init_system_message))
+            input_tokens = count_messages_tokens(new_messages)
+            graph_input = {
+                "messages": new_messages,
+                "token_count": input_tokens + session.token_backfill,
+            }
+
+            if not game_state.get("players"):
+                game_state["players"] = await self.init_character_info(game_state)
+                graph_input["players"] = game_state["players"]
+
+            events = self.dnd_graph.astream(
+                graph_input,
+                config=cfg,
+                stream_mode=["messages", "updates"],
+                durability=CFG.checkpoint_durability,
+            )
+            response_content = ""
+            try:
+                async for mode, payload in events:
+                    if mode == "messages":
+                        chunk, metadata = payload
+                        # Only narration from the Game Master node, tool call chunks carry no text
+                        if metadata.get("langgraph_node") == "main_chat_node" and isinstance(chunk.content, str) and chunk.content:
+                            yield {"event": "token", "id": chunk.id, "data": chunk.content}
+                        continue
+
+                    for node, update in payload.items():
+                        session.token_count += (update or {}).get("token_count", 0)
+                        for message in (update or {}).get("messages", []):
+                            message.pretty_print()
+                            if node == "tools_node":
+                                yield {"event": "tool_end", "id": message.tool_call_id, "name": message.name, "status": message.status}
+                            elif node == "main_chat_node" and message.tool_calls:
+                                # Arguments stay server side, they can hold hidden DCs and monster stats
+                                for tool_call in message.tool_calls:
+                                    yield {"event": "tool_start", "id": tool_call["id"], "name": tool_call["name"]}
+                            elif node == "main_chat_node":
+                                response_content = message.content
+            except BaseException:
+                # Failed or abandoned turn: let the checkpoint decide next turn whether the
+                # thread was started and the players were saved. The session stays cached,
+                # turns queued on its lock must not race a second session of the thread.
+                session.stale = True
+                raise
+            session.started = True
+            session.token_backfill = 0
+            session.token_count += input_tokens
+
+        self.schedule_compaction(session_id, session)
+        yield {"event": "message", "data": response_content}
+
+    def schedule_compaction(self, session_id: str, session: Session) -> None:
+        """Starts a background summarization once the thread outgrows the token limit."""
+        if session.token_count <= TOKEN_LIMIT:
+            return
+        if session.compaction is not None and not session.compaction.done():
+            return
+        session.compaction = asyncio.create_task(self.compact(session_id, session))
+
+    async def compact(self, session_id: str, session: Session) -> None:
+        cfg = {"configurable": {"thread_id": session_id}}
+        try:
+            token_delta = await compact_history(self.dnd_graph, cfg, session.lock)
+            session.token_count += token_delta
+        except Exception as e:
+            print(f"Error summarizing session {session_id}: {e}")
+
     def generate_embedding(self, text: str) -> List[float]:
         """
         Generate embedding for a given text using OpenAI.
+        Repeated texts are answered from the shared embedding cache.
 
         Args:
             text: Text to generate embedding for
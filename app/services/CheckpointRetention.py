@@ -0,0 +1,238 @@
+import asyncio
+import json
+from app.config.LoadAppConfig import LoadAppConfig
+from app.services.MessageLogSaver import MESSAGE_LOG_KEY
+from app.services.SqliteService import sqlite_service
+
+CFG = LoadAppConfig()
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class CheckpointRetention:
+    """Background job bounding the size of the checkpoint database.
+
+    For every thread it keeps the newest `keep_last` checkpoints plus the first
+    checkpoint of each of the newest `keep_turns` turns, deletes everything else
+    and the message log rows no remaining checkpoint refers to in small batches,
+    then hands the freed pages back to the filesystem with incremental vacuum. The writer lock is released between batches so turns keep
+    checkpointing while the job runs.
+
+    Attributes:
+        keep_last (int): Newest checkpoints always kept per thread.
+        keep_turns (int | None): Turn checkpoints kept beyond those, None keeps all.
+        batch_size (int): Checkpoints deleted per transaction.
+        vacuum_pages (int): Pages released per incremental vacuum step.
+        interval_seconds (float): Pause between two passes.
+        convert_auto_vacuum (bool): Whether to switch a database created without incremental
+            auto-vacuum with a full VACUUM, which blocks every checkpoint write while it runs.
+    """
+
+    def __init__(
+        self,
+        keep_last: int,
+        keep_turns: int | None,
+        batch_size: int,
+        vacuum_pages: int,
+        interval_seconds: float,
+        convert_auto_vacuum: bool,
+    ) -> None:
+        self.keep_last = keep_last
+        self.keep_turns = keep_turns
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.interval_seconds = interval_seconds
+        self.convert_auto_vacuum = convert_auto_vacuum
+        self.task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self) -> None:
+        try:
+            await self.enable_incremental_vacuum()
+        except Exception as e:
+            # e.g. SQLITE_FULL, a VACUUM needs up to the database's size again in free space
+            print(f"Checkpoint retention: incremental auto-vacuum conversion failed, pruning without it: {e}")
+        while True:
+            try:
+                await self.prune_once()
+            except Exception as e:
+                print(f"Checkpoint retention error: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    async def pragma(self, name: str) -> int:
+        async with sqlite_service.conn.execute(f"PRAGMA {name}") as cur:
+            return (await cur.fetchone())[0]
+
+    async def enable_incremental_vacuum(self) -> None:
+        """Switches an existing database to incremental auto-vacuum, a one-time full VACUUM.
+
+        Only done when convert_auto_vacuum is set. Otherwise pruned pages are still reused
+        by new checkpoints, they are just not handed back to the filesystem.
+        """
+        checkpointer = sqlite_service.checkpointer
+        async with checkpointer.lock:
+            if await self.pragma("auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+                return
+            if not self.convert_auto_vacuum:
+                print(
+                    "Checkpoint retention: database is not in incremental auto-vacuum mode, skipping the "
+                    "conversion. Freed pages are reused but the file will not shrink. Set "
+                    "checkpoint.retention.convert_auto_vacuum or run "
+                    "'PRAGMA auto_vacuum=INCREMENTAL; VACUUM;' on the database while the server is stopped."
+                )
+                return
+            print("Checkpoint retention: converting database to incremental auto-vacuum")
+            await checkpointer.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            await checkpointer.conn.execute("VACUUM")
+
+    def select_expired(self, rows: list[tuple[str, str, str | None, str | None]]) -> list[tuple[str, str]]:
+        """Picks the checkpoints of one thread that fall outside the retention policy.
+
+        Args:
+            rows: (checkpoint_ns, checkpoint_id, metadata source, durability) ordered oldest first
+
+        Returns:
+            (checkpoint_ns, checkpoint_id) pairs to delete
+        """
+        keep = set(range(max(len(rows) - self.keep_last, 0), len(rows)))
+
+        # Every turn starts with an "input" checkpoint holding the state the previous turn ended
+        # with, keeping those is one per turn and stays stable across passes. Turns run with
+        # "exit" durability save a single checkpoint, which stands for the whole turn.
+        turn_starts = [i for i, row in enumerate(rows) if row[2] == "input" or row[3] == "exit"]
+        if self.keep_turns is not None:
+            turn_starts = turn_starts[-self.keep_turns:] if self.keep_turns else []
+        keep.update(turn_starts)
+
+        return [(ns, checkpoint_id) for i, (ns, checkpoint_id, *_) in enumerate(rows) if i not in keep]
+
+    async def prune_thread(self, thread_id: str) -> int:
+        checkpointer = sqlite_service.checkpointer
+        async with checkpointer.lock:
+            async with checkpointer.conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id, json_extract(CAST(metadata AS TEXT), '$.source'), "
+                "json_extract(CAST(metadata AS TEXT), '$.durability') "
+                "FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_ns, checkpoint_id",
+                (thread_id,),
+            ) as cur:
+                rows = await cur.fetchall()
+
+        expired = []
+        for ns in {row[0] for row in rows}:
+            expired.extend(self.select_expired([row for row in rows if row[0] == ns]))
+
+        for start in range(0, len(expired), self.batch_size):
+            batch = expired[start:start + self.batch_size]
+            params = [(thread_id, ns, checkpoint_id) for ns, checkpoint_id in batch]
+            async with checkpointer.lock:
+                await checkpointer.conn.executemany(
+                    "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    params,
+                )
+                await checkpointer.conn.executemany(
+                    "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    params,
+                )
+                await checkpointer.conn.commit()
+            # Let queued checkpoint writes in before the next batch
+            await asyncio.sleep(0)
+        return len(expired)
+
+    async def prune_message_log(self, thread_id: str) -> int:
+        """Deletes the message log rows of a thread that no remaining checkpoint points to."""
+        checkpointer = sqlite_service.checkpointer
+        async with checkpointer.lock:
+            # Read both in one go, new checkpoints only ever add rows they reference
+            async with checkpointer.conn.execute(
+                f"SELECT checkpoint_ns, json_extract(CAST(metadata AS TEXT), '$.{MESSAGE_LOG_KEY}') "
+                "FROM checkpoints WHERE thread_id = ?",
+                (thread_id,),
+            ) as cur:
+                references = await cur.fetchall()
+            async with checkpointer.conn.execute(
+                "SELECT checkpoint_ns, seq FROM message_log WHERE thread_id = ?",
+                (thread_id,),
+            ) as cur:
+                logged = await cur.fetchall()
+
+        referenced = set()
+        for ns, ranges in references:
+            for first, last in json.loads(ranges) if ranges else []:
+                referenced.update((ns, seq) for seq in range(first, last + 1))
+        unreferenced = [row for row in logged if (row[0], row[1]) not in referenced]
+
+        for start in range(0, len(unreferenced), self.batch_size):
+            batch = unreferenced[start:start + self.batch_size]
+            async with checkpointer.lock:
+                await checkpointer.conn.executemany(
+                    "DELETE FROM message_log WHERE thread_id = ? AND checkpoint_ns = ? AND seq = ?",
+                    [(thread_id, ns, seq) for ns, seq in batch],
+                )
+                await checkpointer.conn.commit()
+                checkpointer.forget_thread(thread_id)
+            await asyncio.sleep(0)
+        return len(unreferenced)
+
+    async def vacuum(self) -> int:
+        """Releases free pages in small steps and returns the bytes reclaimed."""
+        checkpointer = sqlite_service.checkpointer
+        page_size = await self.pragma("page_size")
+        reclaimed_pages = 0
+        while True:
+            async with checkpointer.lock:
+                free_pages = await self.pragma("freelist_count")
+                if not free_pages:
+                    break
+                await checkpointer.conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})")
+                await checkpointer.conn.commit()
+                released = free_pages - await self.pragma("freelist_count")
+            if released <= 0:
+                break
+            reclaimed_pages += released
+            await asyncio.sleep(0)
+        return reclaimed_pages * page_size
+
+    async def prune_once(self) -> dict:
+        """Runs one retention pass over every thread and reports what it freed."""
+        checkpointer = sqlite_service.checkpointer
+        async with checkpointer.lock:
+            async with checkpointer.conn.execute("SELECT DISTINCT thread_id FROM checkpoints") as cur:
+                thread_ids = [row[0] for row in await cur.fetchall()]
+
+        pruned = 0
+        messages_pruned = 0
+        for thread_id in thread_ids:
+            pruned += await self.prune_thread(thread_id)
+            messages_pruned += await self.prune_message_log(thread_id)
+        reclaimed = await self.vacuum()
+
+        report = {
+            "threads": len(thread_ids),
+            "checkpoints_pruned": pruned,
+            "messages_pruned": messages_pruned,
+            "bytes_reclaimed": reclaimed,
+        }
+        print(f"Checkpoint retention: {report}")
+        return report
+
+
+checkpoint_retention = CheckpointRetention(
+    keep_last=CFG.checkpoint_retention_keep_last,
+    keep_turns=CFG.checkpoint_retention_keep_turns,
+    batch_size=CFG.checkpoint_retention_batch_size,
+    vacuum_pages=CFG.checkpoint_retention_vacuum_pages,
+    interval_seconds=CFG.checkpoint_retention_interval_seconds,
+    convert_auto_vacuum=CFG.checkpoint_retention_convert_auto_vacuum,
+)
@@ -0,0 +1,191 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+import zstandard
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+ZSTD_SUFFIX = "+zstd"
+
+
+class ZstdSerializer(SerializerProtocol):
+    """Checkpoint serializer compressing the typed payloads of another serializer with zstd.
+
+    Compressed payloads are tagged by appending "+zstd" to their type, the same way
+    LangGraph's EncryptedSerializer tags ciphertext, so checkpoints written before
+    compression was turned on are still read as they are.
+
+    Checkpoints of one game look alike (message classes, tool calls, Vietnamese
+    narration), which is what zstd dictionaries are for. Until a dictionary exists the
+    serializer compresses without one and keeps a sample of payloads; once enough are
+    collected it trains a dictionary in a background thread.
+
+    Every worker sharing the database uses the same dictionary: the first one to
+    train it links it into `dict_path` exclusively, the others find the file taken
+    and load it instead of their own. Each dictionary is also kept as
+    `<dict_path stem>.<dict_id>.dict`, and frames are decompressed with the
+    dictionary of the id they record, so no frame ever becomes unreadable.
+
+    Attributes:
+        dict_path (Path): File holding the dictionary new payloads are compressed with.
+        compress (bool): Whether new payloads are compressed, reading works either way.
+        level (int): zstd compression level.
+        min_size (int): Payloads smaller than this are stored uncompressed.
+        dict_size (int): Size in bytes of the dictionary to train.
+        train_samples (int): Payloads collected before training the dictionary.
+        dictionaries (dict): Dictionaries loaded so far keyed by id, for decompression.
+    """
+
+    def __init__(
+        self,
+        dict_path: str,
+        compress: bool = True,
+        level: int = 3,
+        min_size: int = 256,
+        dict_size: int = 65536,
+        train_samples: int = 500,
+        serde: SerializerProtocol | None = None,
+    ) -> None:
+        self.serde = serde or JsonPlusSerializer()
+        self.dict_path = Path(dict_path)
+        self.compress = compress
+        self.level = level
+        self.min_size = min_size
+        self.dict_size = dict_size
+        self.train_samples = train_samples
+        self.samples: list[bytes] = []
+        self.dictionary: zstandard.ZstdCompressionDict | None = None
+        self.dictionaries: dict[int, zstandard.ZstdCompressionDict] = {}
+        self._training: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._load_dictionary()
+        self._compressor = self._make_compressor()
+
+    def _id_path(self, dict_id: int) -> Path:
+        return self.dict_path.with_name(f"{self.dict_path.stem}.{dict_id}{self.dict_path.suffix}")
+
+    def _read_dictionary(self, path: Path) -> zstandard.ZstdCompressionDict:
+        dictionary = zstandard.ZstdCompressionDict(path.read_bytes())
+        self.dictionaries[dictionary.dict_id()] = dictionary
+        return dictionary
+
+    def _load_dictionary(self) -> bool:
+        """Adopts the dictionary in `dict_path` if there is one, True when it did."""
+        if not self.dict_path.exists():
+            return False
+        dictionary = self._read_dictionary(self.dict_path)
+        with self._lock:
+            self.dictionary = dictionary
+            self._compressor = self._make_compressor()
+            self.samples = []
+        print(f"Checkpoint compression: loaded dictionary {dictionary.dict_id()} from {self.dict_path}")
+        return True
+
+    def _make_compressor(self) -> zstandard.ZstdCompressor:
+        return zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+
+    def _train(self, samples: list[bytes]) -> None:
+        """Trains and publishes a dictionary, runs in a background thread."""
+        try:
+            # Another worker may have published one since this process started
+            if self._load_dictionary():
+                return
+            start = time.perf_counter()
+            try:
+                dictionary = zstandard.train_dictionary(self.dict_size, samples, level=self.level)
+            except zstandard.ZstdError as e:
+                # Too little material yet, keep compressing without a dictionary and sample again
+                print(f"Checkpoint compression: dictionary training failed: {e}")
+                with self._lock:
+                    self.samples = samples[len(samples) // 2:]
+                return
+
+            self.dict_path.parent.mkdir(parents=True, exist_ok=True)
+            id_path = self._id_path(dictionary.dict_id())
+            tmp_path = id_path.with_suffix(id_path.suffix + ".tmp")
+            tmp_path.write_bytes(dictionary.as_bytes())
+            tmp_path.replace(id_path)
+            try:
+                # Fails if the file exists, the first worker to get here picks the dictionary for all
+                os.link(id_path, self.dict_path)
+            except FileExistsError:
+                id_path.unlink(missing_ok=True)
+                self._load_dictionary()
+                return
+
+            self.dictionaries[dictionary.dict_id()] = dictionary
+            with self._lock:
+                self.dictionary = dictionary
+                self._compressor = self._make_compressor()
+                self.samples = []
+            print(
+                f"Checkpoint compression: trained dictionary {dictionary.dict_id()} "
+                f"in {time.perf_counter() - start:.2f}s, saved to {self.dict_path}"
+            )
+        except Exception as e:
+            print(f"Checkpoint compression: dictionary training error: {e}")
+        finally:
+            self._training = None
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        """Serializes with the wrapped serializer and compresses the bytes when worth it."""
+        typ, data = self.serde.dumps_typed(obj)
+        if not self.compress or len(data) < self.min_size:
+            return typ, data
+
+        with self._lock:
+            if self.dictionary is None and self._training is None:
+                self.samples.append(data)
+                if len(self.samples) >= self.train_samples:
+                    # Training takes a while, it must not hold up the checkpoint being written
+                    self._training = threading.Thread(target=self._train, args=(self.samples,), daemon=True)
+                    self.samples = []
+                    self._training.start()
+            # ZstdCompressor instances must not be shared between threads at once
+            compressed = self._compressor.compress(data)
+
+        if len(compressed) >= len(data):
+            return typ, data
+        return f"{typ}{ZSTD_SUFFIX}", compressed
+
+    def dictionary_for(self, dict_id: int) -> zstandard.ZstdCompressionDict:
+        """Returns the dictionary a frame was compressed with, loading it from disk on first use."""
+        dictionary = self.dictionaries.get(dict_id)
+        if dictionary is None:
+            id_path = self._id_path(dict_id)
+            if id_path.exists():
+                dictionary = self._read_dictionary(id_path)
+            elif self.dict_path.exists():
+                # Dictionaries published before they were also kept by id
+                dictionary = zstandard.ZstdCompressionDict(self.dict_path.read_bytes())
+                if dictionary.dict_id() != dict_id:
+                    dictionary = None
+                else:
+                    self.dictionaries[dict_id] = dictionary
+        if dictionary is None:
+            raise ValueError(
+                f"Checkpoint was compressed with zstd dictionary {dict_id}, "
+                f"found neither {self._id_path(dict_id)} nor a matching {self.dict_path}"
+            )
+        return dictionary
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        typ, payload = data
+        # Uncompressed, either small or written before compression was enabled
+        if not typ.endswith(ZSTD_SUFFIX):
+            return self.serde.loads_typed(data)
+
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        if dict_id:
+            decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionary_for(dict_id))
+        else:
+            decompressor = zstandard.ZstdDecompressor()
+        return self.serde.loads_typed((typ[: -len(ZSTD_SUFFIX)], decompressor.decompress(payload)))
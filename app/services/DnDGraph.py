@@ -1,11 +1,12 @@
+import asyncio
 import os
 from langgraph.graph import StateGraph, START
 from langchain_openai import ChatOpenAI
 from app.config.LoadAppConfig import LoadAppConfig
 from app.DTOs.GameState import GameState
 from app.services.RAGTool import monster_query_tool, player_query_tool, phandelverstory_query_tool, handle_skill_check_tool, combat_tool, ask_skill_check_tool
-from app.services.ToolNode import BasicToolNode, route_tools
-from app.services.SummarizerNode import summarize_history_node, check_for_summarization
+from app.services.ToolNode import AsyncToolNode, route_tools
+from app.services.SummarizerNode import count_message_tokens, with_summary
 from app.services.SqliteService import sqlite_service
 from dotenv import load_dotenv
 
@@ -38,11 +39,22 @@ def build_graph():
 
     dnd_llm_with_tools = dnd_llm.bind_tools(tools)
 
-    def handle_chat(state: GameState):
-        return {"messages": [dnd_llm_with_tools.invoke(state["messages"])]}
+    # Caps in-flight LLM calls across every session sharing this graph
+    llm_semaphore = asyncio.Semaphore(CFG.max_concurrent_llm_calls)
+
+    async def handle_chat(state: GameState):
+        async with llm_semaphore:
+            response = await dnd_llm_with_tools.ainvoke(
+                with_summary(state["messages"], state.get("summary"))
+            )
+        return {"messages": [response], "token_count": count_message_tokens(response)}
 
     dnd_graph.add_node("main_chat_node", handle_chat)
-    tool_node = BasicToolNode(tools=tools)
+    tool_node = AsyncToolNode(
+        tools=tools,
+        default_timeout=CFG.tool_timeout_seconds,
+        timeouts=CFG.tool_timeouts,
+    )
     dnd_graph.add_node("tools_node", tool_node)
 
     dnd_graph.add_conditional_edges(
@@ -53,14 +65,6 @@ def build_graph():
 
     dnd_graph.add_edge("tools_node", "main_chat_node")
     dnd_graph.add_edge(START, "main_chat_node")
-    
-    dnd_graph.add_node("summarize_history", summarize_history_node)
-    dnd_graph.add_conditional_edges(
-        "tools_node", # Check after tools/before LLM call
-        check_for_summarization,
-        {"summarize_history": "summarize_history", "continue": "main_chat_node"}
-    )
-    dnd_graph.add_edge("summarize_history", "main_chat_node")
 
     graph = dnd_graph.compile(checkpointer=sqlite_service.checkpointer)
 
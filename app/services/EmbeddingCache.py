@@ -0,0 +1,183 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+from langchain_core.embeddings import Embeddings
+from app.config.LoadAppConfig import LoadAppConfig
+
+CFG = LoadAppConfig()
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace and case so repeated player questions share a key."""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingCache:
+    """Two-tier cache of query embeddings.
+
+    An in-memory LRU sits in front of a SQLite table keyed by
+    (model name, normalized text hash). Both tiers evict by size: the LRU drops
+    its least recently used entry, the table drops its oldest rows in batches.
+
+    Attributes:
+        hits (int): Lookups answered from memory or disk.
+        misses (int): Lookups that had to go to the embedding API.
+    """
+
+    def __init__(self, db_path: str, max_memory_entries: int, max_disk_entries: int) -> None:
+        self.db_path = db_path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory: OrderedDict[tuple[str, str], List[float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._disk_count = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used ON embedding_cache (last_used)"
+            )
+            self._conn.commit()
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, text: str) -> tuple[str, str]:
+        text_hash = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return model, text_hash
+
+    def _remember(self, key: tuple[str, str], vector: List[float]) -> None:
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def get(self, model: str, text: str) -> List[float] | None:
+        """Looks up an embedding, promoting disk hits into memory.
+
+        Args:
+            model: Name of the embedding model that produced the vector
+            text: Raw query text
+
+        Returns:
+            The cached embedding, or None on a miss
+        """
+        key = self.make_key(model, text)
+        with self._lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT vector FROM embedding_cache WHERE model = ? AND text_hash = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            conn.execute(
+                "UPDATE embedding_cache SET last_used = ? WHERE model = ? AND text_hash = ?",
+                (time.time(), *key),
+            )
+            conn.commit()
+            vector = array("f", row[0]).tolist()
+            self._remember(key, vector)
+            self.hits += 1
+            return vector
+
+    def put(self, model: str, text: str, vector: List[float]) -> None:
+        """Stores an embedding in both tiers, evicting the oldest rows when the table is full."""
+        key = self.make_key(model, text)
+        with self._lock:
+            self._remember(key, vector)
+            conn = self._connect()
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO embedding_cache (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                (*key, array("f", vector).tobytes(), time.time()),
+            )
+            self._disk_count += cur.rowcount
+            if self._disk_count > self.max_disk_entries:
+                # Trim a tenth of the table at once so eviction isn't paid on every insert
+                overflow = self._disk_count - self.max_disk_entries + self.max_disk_entries // 10
+                conn.execute(
+                    "DELETE FROM embedding_cache WHERE rowid IN "
+                    "(SELECT rowid FROM embedding_cache ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._disk_count = conn.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+            conn.commit()
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and the size of both tiers."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_entries": self._disk_count,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class CachedEmbeddings(Embeddings):
+    """LangChain Embeddings wrapper that answers repeated texts from an EmbeddingCache."""
+
+    def __init__(self, embeddings: Embeddings, model: str, cache: EmbeddingCache) -> None:
+        self.embeddings = embeddings
+        self.model = model
+        self.cache = cache
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model, text, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: list[List[float] | None] = [self.cache.get(self.model, text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                self.cache.put(self.model, texts[i], vector)
+                vectors[i] = vector
+        return vectors
+
+
+embedding_cache = EmbeddingCache(
+    db_path=CFG.embedding_cache_path,
+    max_memory_entries=CFG.embedding_cache_max_memory_entries,
+    max_disk_entries=CFG.embedding_cache_max_disk_entries,
+)
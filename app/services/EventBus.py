@@ -0,0 +1,120 @@
+import asyncio
+from collections.abc import Callable
+from contextlib import asynccontextmanager
+from app.config.LoadAppConfig import LoadAppConfig
+from app.services.BroadcastBackend import InMemoryBroadcastBackend, RedisBroadcastBackend
+
+CFG = LoadAppConfig()
+
+
+def room_topic(room_id: str) -> str:
+    """Topic carrying the frames of one game room."""
+    return f"room:{room_id}"
+
+
+def room_sync_topic(room_id: str) -> str:
+    """Topic the workers serving one room use to exchange their member lists."""
+    return f"room-sync:{room_id}"
+
+
+def room_owner_key(room_id: str) -> str:
+    """Lease held by the worker writing a room's thread, whether its turns come from websockets or REST."""
+    return f"room-owner:{room_id}"
+
+
+class EventBus:
+    """Publish/subscribe hub between the REST controllers and the websocket rooms.
+
+    Events are published through a broadcast backend: in memory when one process
+    serves every room, or a Redis-protocol server so that every worker with members
+    in a room gets its events. The backend hands events back to `dispatch`, which
+    runs the local handlers synchronously. Handlers are expected to hand the event
+    off (the websocket service puts it on each member's send queue) rather than do
+    I/O, so publishing never waits on a client.
+
+    Attributes:
+        backend: Broadcast backend carrying events between workers.
+        subscribers (dict): Local handlers keyed by topic.
+    """
+
+    def __init__(self, backend) -> None:
+        self.backend = backend
+        self.backend.dispatch = self.dispatch
+        self.subscribers: dict[str, list[Callable[[dict], None]]] = {}
+
+    async def start(self) -> None:
+        await self.backend.start()
+
+    async def stop(self) -> None:
+        await self.backend.close()
+
+    @asynccontextmanager
+    async def hold_lease(self, key: str, owner: str, ttl_ms: int):
+        """Renews a lease the caller already holds for as long as the block runs.
+
+        A turn can outlast the lease, every LLM call of it may take minutes, so the
+        lease is extended every third of its length until the block exits.
+
+        Args:
+            key: Lease to renew, see `room_owner_key`
+            owner: Holder of the lease, this worker's id
+            ttl_ms: Length each renewal extends the lease to
+        """
+        async def renew():
+            while True:
+                await asyncio.sleep(ttl_ms / 3000)
+                try:
+                    if not await self.backend.claim(key, owner, ttl_ms):
+                        print(f"Lease {key} was taken over by another owner")
+                        return
+                except Exception as e:
+                    print(f"Lease {key} renewal error: {e}")
+
+        heartbeat = asyncio.create_task(renew())
+        try:
+            yield
+        finally:
+            heartbeat.cancel()
+
+    def subscribe(self, topic: str, handler: Callable[[dict], None]) -> None:
+        if topic not in self.subscribers:
+            self.backend.subscribe(topic)
+        self.subscribers.setdefault(topic, []).append(handler)
+
+    def unsubscribe(self, topic: str, handler: Callable[[dict], None]) -> None:
+        handlers = self.subscribers.get(topic)
+        if not handlers:
+            return
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            del self.subscribers[topic]
+            self.backend.unsubscribe(topic)
+
+    def publish(self, topic: str, event: dict) -> None:
+        """Sends an event to every handler of a topic, on this worker and the others.
+
+        Args:
+            topic: Topic to publish on, see `room_topic`
+            event: JSON serializable event
+        """
+        self.backend.publish(topic, event)
+
+    def dispatch(self, topic: str, event: dict) -> int:
+        """Runs the local handlers of a topic and returns how many there were."""
+        handlers = list(self.subscribers.get(topic, ()))
+        for handler in handlers:
+            try:
+                handler(event)
+            except Exception as e:
+                print(f"Event handler error on {topic}: {e}")
+        return len(handlers)
+
+
+def make_backend():
+    if CFG.ws_broadcast_backend == "redis":
+        return RedisBroadcastBackend(CFG.ws_broadcast_redis_url, CFG.ws_broadcast_reconnect_seconds)
+    return InMemoryBroadcastBackend()
+
+
+event_bus = EventBus(make_backend())
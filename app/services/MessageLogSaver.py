@@ -0,0 +1,290 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from typing import Any
+import aiosqlite
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_metadata,
+)
+from app.services.PooledSqliteSaver import PooledAsyncSqliteSaver
+
+MESSAGES_CHANNEL = "messages"
+# Key of the reference stored in place of the message list, in the blob and in the metadata
+MESSAGE_LOG_KEY = "message_log"
+
+
+def to_ranges(seqs: list[int]) -> list[list[int]]:
+    """Packs an ordered list of log offsets into [first, last] runs of consecutive offsets."""
+    ranges: list[list[int]] = []
+    for seq in seqs:
+        if ranges and ranges[-1][1] + 1 == seq:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return ranges
+
+
+@dataclass
+class LogEntry:
+    seq: int
+    digest: bytes
+    # The object last stored under this offset, an identical object needs no re-serialization
+    message: BaseMessage | None = None
+
+
+@dataclass
+class ThreadLog:
+    next_seq: int
+    # Row count of the log when it was last read or written, with next_seq it tells whether
+    # another process changed the log since
+    rows: int = 0
+    entries: dict[str, LogEntry] = field(default_factory=dict)
+
+
+class MessageLogSqliteSaver(PooledAsyncSqliteSaver):
+    """Checkpointer writing every message once to an append-only log.
+
+    The `messages` channel of a checkpoint is replaced by the runs of log offsets
+    it is made of, so a checkpoint costs the size of its new messages instead of the
+    whole conversation. Offsets are per (thread_id, checkpoint_ns) and only grow; a
+    message edited in place (same id, different content) gets a new offset. Reads
+    rebuild the list from the log, and checkpoints written before the log existed
+    still carry their full list and are returned as they are.
+
+    The offsets are also saved in the checkpoint metadata, which lets the retention
+    job find log rows no checkpoint refers to any more without decoding blobs.
+
+    Several processes may write the same thread (workers sharing the database file).
+    The cached offset map of a thread is checked against the log inside the write
+    transaction and reloaded when another process appended or deleted rows, and rows
+    are inserted without REPLACE so two writers can never reuse an offset silently.
+
+    Attributes:
+        max_cached_threads (int): Threads whose message id -> offset map is kept in memory.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        reader_conns: list[aiosqlite.Connection],
+        *,
+        serde: SerializerProtocol | None = None,
+        max_cached_threads: int = 256,
+    ):
+        super().__init__(conn, reader_conns, serde=serde)
+        self.max_cached_threads = max_cached_threads
+        self.thread_logs: OrderedDict[tuple[str, str], ThreadLog] = OrderedDict()
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        await super().setup()
+        await self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS message_log (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL DEFAULT '',
+                seq INTEGER NOT NULL,
+                message_id TEXT,
+                digest BLOB NOT NULL,
+                type TEXT NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (thread_id, checkpoint_ns, seq)
+            );
+            """
+        )
+        await self.conn.commit()
+
+    async def thread_log(self, thread_id: str, checkpoint_ns: str) -> ThreadLog:
+        """Returns the offset map of a thread, loading it from the log on a miss or when it is stale.
+
+        Call with the lock held, inside the write transaction so the log cannot change
+        between the check and the write.
+        """
+        key = (thread_id, checkpoint_ns)
+        log = self.thread_logs.get(key)
+        if log is not None:
+            async with self.conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(seq) + 1, 0) FROM message_log WHERE thread_id = ? AND checkpoint_ns = ?",
+                key,
+            ) as cur:
+                rows, next_seq = await cur.fetchone()
+            if (rows, next_seq) != (log.rows, log.next_seq):
+                # Written or pruned by another process
+                log = None
+        if log is None:
+            log = ThreadLog(next_seq=0)
+            async with self.conn.execute(
+                "SELECT seq, message_id, digest FROM message_log WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY seq",
+                key,
+            ) as cur:
+                async for seq, message_id, digest in cur:
+                    log.next_seq = seq + 1
+                    log.rows += 1
+                    if message_id is not None:
+                        log.entries[message_id] = LogEntry(seq, digest)
+            self.thread_logs[key] = log
+        self.thread_logs.move_to_end(key)
+        while len(self.thread_logs) > self.max_cached_threads:
+            self.thread_logs.popitem(last=False)
+        return log
+
+    def forget_thread(self, thread_id: str) -> None:
+        """Drops the cached offset maps of a thread after its log rows changed. Call with the lock held."""
+        for key in [key for key in self.thread_logs if key[0] == thread_id]:
+            del self.thread_logs[key]
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        messages = checkpoint["channel_values"].get(MESSAGES_CHANNEL)
+        if not isinstance(messages, list):
+            return await super().aput(config, checkpoint, metadata, new_versions)
+
+        await self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        async with self.lock:
+            try:
+                # Take the database write lock before reading the log, so no other process
+                # appends to it between the staleness check and the insert
+                if not self.conn.in_transaction:
+                    await self.conn.execute("BEGIN IMMEDIATE")
+                log = await self.thread_log(thread_id, checkpoint_ns)
+                next_seq = log.next_seq
+                seqs: list[int] = []
+                rows = []
+                updated: dict[str, LogEntry] = {}
+                for message in messages:
+                    entry = updated.get(message.id) or log.entries.get(message.id)
+                    if entry is not None and entry.message is message:
+                        seqs.append(entry.seq)
+                        continue
+                    # Digest the plain encoding, the stored one may be compressed with a dictionary trained since
+                    plain_type, plain = self.jsonplus_serde.dumps_typed(message)
+                    digest = hashlib.blake2b(plain_type.encode() + plain, digest_size=16).digest()
+                    if entry is None or entry.digest != digest:
+                        entry = LogEntry(next_seq, digest)
+                        rows.append((thread_id, checkpoint_ns, next_seq, message.id, digest, *self.serde.dumps_typed(message)))
+                        next_seq += 1
+                    if message.id is not None:
+                        updated[message.id] = LogEntry(entry.seq, digest, message)
+                    seqs.append(entry.seq)
+
+                ranges = to_ranges(seqs)
+                stored = {**checkpoint, "channel_values": {**checkpoint["channel_values"], MESSAGES_CHANNEL: {MESSAGE_LOG_KEY: ranges}}}
+                type_, serialized_checkpoint = self.serde.dumps_typed(stored)
+                serialized_metadata = self.jsonplus_serde.dumps(
+                    get_checkpoint_metadata(config, {**metadata, MESSAGE_LOG_KEY: ranges})
+                )
+                # A plain INSERT, an offset already taken is an error rather than an overwrite
+                await self.conn.executemany(
+                    "INSERT INTO message_log (thread_id, checkpoint_ns, seq, message_id, digest, type, value) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                await self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        serialized_checkpoint,
+                        serialized_metadata,
+                    ),
+                )
+                await self.conn.commit()
+            except BaseException as e:
+                await self.conn.rollback()
+                self.forget_thread(thread_id)
+                if isinstance(e, sqlite3.IntegrityError):
+                    raise RuntimeError(f"Message log of thread {thread_id} was written concurrently: {e}") from e
+                raise
+            # Only remember offsets once they are on disk
+            log.next_seq = next_seq
+            log.rows += len(rows)
+            log.entries.update(updated)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def load_messages(
+        self, conn: aiosqlite.Connection, checkpoint_tuple: CheckpointTuple | None
+    ) -> CheckpointTuple | None:
+        """Replaces the log reference of a checkpoint with the messages it points to."""
+        if checkpoint_tuple is None:
+            return None
+        reference = checkpoint_tuple.checkpoint["channel_values"].get(MESSAGES_CHANNEL)
+        if not isinstance(reference, dict) or MESSAGE_LOG_KEY not in reference:
+            # Written before the message log, the list is in the blob
+            return checkpoint_tuple
+
+        configurable = checkpoint_tuple.config["configurable"]
+        thread_id = str(configurable["thread_id"])
+        checkpoint_ns = configurable.get("checkpoint_ns", "")
+        messages = []
+        log = self.thread_logs.get((thread_id, checkpoint_ns))
+        for first, last in reference[MESSAGE_LOG_KEY]:
+            async with conn.execute(
+                "SELECT seq, message_id, digest, type, value FROM message_log "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND seq BETWEEN ? AND ? ORDER BY seq",
+                (thread_id, checkpoint_ns, first, last),
+            ) as cur:
+                rows = await cur.fetchall()
+            if len(rows) != last - first + 1:
+                raise ValueError(
+                    f"Message log of thread {thread_id} is missing offsets {first}-{last} "
+                    f"used by checkpoint {configurable['checkpoint_id']}"
+                )
+            for seq, message_id, digest, type_, value in rows:
+                message = self.serde.loads_typed((type_, value))
+                entry = log.entries.get(message_id) if log is not None else None
+                if entry is not None and entry.seq == seq and entry.digest == digest:
+                    # The next turn writes this object back, remembering it spares re-encoding it for the digest
+                    entry.message = message
+                messages.append(message)
+
+        checkpoint_tuple.checkpoint["channel_values"][MESSAGES_CHANNEL] = messages
+        return checkpoint_tuple
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        async with self.borrow_reader() as reader:
+            return await self.load_messages(reader.conn, await reader.aget_tuple(config))
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async with self.borrow_reader() as reader:
+            async for checkpoint_tuple in reader.alist(config, filter=filter, before=before, limit=limit):
+                yield await self.load_messages(reader.conn, checkpoint_tuple)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self.conn.execute("DELETE FROM message_log WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.commit()
+            self.forget_thread(str(thread_id))
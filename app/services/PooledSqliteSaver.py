@@ -0,0 +1,61 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+import aiosqlite
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import CheckpointTuple, SerializerProtocol
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+
+class PooledAsyncSqliteSaver(AsyncSqliteSaver):
+    """AsyncSqliteSaver with one writer connection and a pool of reader connections.
+
+    Writes (`aput`, `aput_writes`, `adelete_thread`) go through the writer connection
+    exactly as in AsyncSqliteSaver. Reads borrow a reader connection, so under WAL
+    they run next to the writer instead of queueing behind its lock.
+
+    Attributes:
+        readers (asyncio.Queue): Idle reader savers, each bound to its own connection.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        reader_conns: list[aiosqlite.Connection],
+        *,
+        serde: SerializerProtocol | None = None,
+    ):
+        super().__init__(conn, serde=serde)
+        self.readers: asyncio.Queue[AsyncSqliteSaver] = asyncio.Queue()
+        for reader_conn in reader_conns:
+            reader = AsyncSqliteSaver(reader_conn, serde=self.serde)
+            # Tables are created through the writer
+            reader.is_setup = True
+            self.readers.put_nowait(reader)
+
+    @asynccontextmanager
+    async def borrow_reader(self) -> AsyncIterator[AsyncSqliteSaver]:
+        """Lends an idle reader saver for the duration of the block."""
+        await self.setup()
+        reader = await self.readers.get()
+        try:
+            yield reader
+        finally:
+            self.readers.put_nowait(reader)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        async with self.borrow_reader() as reader:
+            return await reader.aget_tuple(config)
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        async with self.borrow_reader() as reader:
+            async for checkpoint_tuple in reader.alist(config, filter=filter, before=before, limit=limit):
+                yield checkpoint_tuple
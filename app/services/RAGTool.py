@@ -1,36 +1,24 @@
-import os
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 from langchain_core.tools import tool
 from app.config.LoadAppConfig import LoadAppConfig
-from dotenv import load_dotenv
+from app.services.VectorStoreRegistry import vectorstore_registry
 
 TOOLS_CFG = LoadAppConfig()
-load_dotenv()
 
-class RAGTool:
-    def __init__(self, k: int, collection_name: str) -> None:
-        """
-        Initializes the monsterRAGTool with the necessary configurations.
+def rag_search(collection_name: str, query: str, k: int) -> str:
+    """
+    Runs a similarity search against a pooled collection handle.
+
+    Args:
+        collection_name (str): The name of the collection inside the vector database.
+        query (str): The player query
+        k (int): The number of nearest neighbor documents to retrieve.
+    Returns:
+        str: The page content of the matching documents
+    """
+    vectordb = vectorstore_registry.get(collection_name)
+    docs = vectordb.similarity_search(query, k=k)
+    return "\n\n".join([doc.page_content for doc in docs])
 
-        Args:
-            k (int): The number of nearest neighbor monster to retrieve based on query similarity.
-            collection_name (str): The name of the collection inside the vector database that holds the relevant monster.
-        """
-        self.embedding_model = TOOLS_CFG.rag_embedding_model
-        self.k = k
-        self.vectordb = Chroma(
-            collection_name=collection_name,
-            persist_directory=TOOLS_CFG.rag_vectordb_directory,
-            embedding_function=OpenAIEmbeddings(
-                model=self.embedding_model,
-                base_url=os.getenv("AZURE_OPENAI_ENDPOINT"),
-                api_key=os.getenv("AZURE_EMBEDDING_API_KEY")
-            )
-        )
-        print("Number of vectors in vectordb:",
-              self.vectordb._collection.count(), "\n\n")
-        
 @tool
 def monster_query_tool(query: str, name: str, size: str, legendary: str, align: str) -> str:
     """
@@ -51,12 +39,7 @@ def monster_query_tool(query: str, name: str, size: str, legendary: str, align:
         >>> Mind Flayer are Psionic tyrants, slavers, and interdimensional voyagers, they are insidious masterminds that harvest entire races for their own twisted ends.
     """
 
-    rag_tool = RAGTool(
-        k=TOOLS_CFG.rag_k_monster,
-        collection_name=TOOLS_CFG.monster_rag_collection_name)
-
-    docs = rag_tool.vectordb.similarity_search(query, k=rag_tool.k)
-    return "\n\n".join([doc.page_content for doc in docs])
+    return rag_search(TOOLS_CFG.monster_rag_collection_name, query, TOOLS_CFG.rag_k_monster)
 
 @tool
 def player_query_tool(query: str) -> str:
@@ -89,13 +72,7 @@ def player_query_tool(query: str) -> str:
         >>> The Greataxe does 1D12 slashing damage by default! Unless you are a savage babarian haha.
         >>> As a Fighter, you will gain an extra attack on level 3. Go beat them up!
     """
-    rag_tool = RAGTool(
-        k=TOOLS_CFG.rag_k_player,
-        collection_name=TOOLS_CFG.player_rag_collection_name
-    )
-    
-    docs = rag_tool.vectordb.similarity_search(query, k=rag_tool.k)
-    return "\n\n".join([doc.page_content for doc in docs])
+    return rag_search(TOOLS_CFG.player_rag_collection_name, query, TOOLS_CFG.rag_k_player)
 
 @tool
 def phandelverstory_query_tool(query: str) -> str:
@@ -123,13 +100,7 @@ def phandelverstory_query_tool(query: str) -> str:
         Yes the Rockseeker brothers recently discovered the long lost entrance to 
         the Wave Echo cave"
     """
-    rag_tool = RAGTool(
-        k=TOOLS_CFG.rag_k_phandelverstory,
-        collection_name=TOOLS_CFG.phandelverstory_rag_collection_name
-    )
-    
-    docs = rag_tool.vectordb.similarity_search(query, k=rag_tool.k)
-    return "\n\n".join([doc.page_content for doc in docs])
+    return rag_search(TOOLS_CFG.phandelverstory_rag_collection_name, query, TOOLS_CFG.rag_k_phandelverstory)
 
 @tool
 def ask_skill_check_tool(skill: str, difficulty: str, player_dice: str, status: str, description: str) -> str:
@@ -0,0 +1,73 @@
+import time
+
+
+class TokenBucket:
+    """Allows `burst` units at once, then `rate` units per second.
+
+    Attributes:
+        rate (float): Units added back per second.
+        burst (float): Most units the bucket holds.
+        tokens (float): Units available as of `updated`.
+        updated (float): Monotonic time of the last refill.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available, 0 when they already are."""
+        self.refill(now)
+        if amount <= self.tokens:
+            return 0.0
+        if amount > self.burst or self.rate <= 0:
+            return float("inf")
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+
+class RateLimit:
+    """Limits both the number of frames and their bytes, a frame passes only if both buckets allow it.
+
+    Attributes:
+        messages (TokenBucket): One token per frame.
+        bytes (TokenBucket): One token per byte of payload.
+    """
+
+    def __init__(self, messages_per_second: float, message_burst: int, bytes_per_second: float, byte_burst: int) -> None:
+        self.messages = TokenBucket(messages_per_second, message_burst)
+        self.bytes = TokenBucket(bytes_per_second, byte_burst)
+
+    def retry_after(self, size: int, now: float) -> float:
+        """Seconds before a frame of `size` bytes would be allowed, 0 when it is now."""
+        return max(self.messages.wait_time(1, now), self.bytes.wait_time(size, now))
+
+    def take(self, size: int) -> None:
+        self.messages.take(1)
+        self.bytes.take(size)
+
+
+def allow(limits: list[RateLimit], size: int) -> float:
+    """Charges a frame to every limit if they all allow it.
+
+    Args:
+        limits: The limits the frame counts against, e.g. its connection's and its room's
+        size: Payload size in bytes
+
+    Returns:
+        0 when the frame was allowed, otherwise the seconds to wait before it would be
+    """
+    now = time.monotonic()
+    retry_after = max(limit.retry_after(size, now) for limit in limits)
+    if retry_after == 0:
+        for limit in limits:
+            limit.take(size)
+    return retry_after
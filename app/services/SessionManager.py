@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict
+from app.DTOs.GameState import GameState
+from app.services.SummarizerNode import count_messages_tokens
+from app.services.ToolNode import repair_tool_calls
+
+
+class Session:
+    """An active game: the state kept outside the graph and the lock serializing its turns.
+
+    The message history lives only in the checkpointed thread, the session just
+    remembers whether that thread has been started.
+    """
+
+    def __init__(
+        self,
+        state: GameState,
+        started: bool,
+        token_count: int = 0,
+        token_backfill: int = 0,
+        stale: bool = False,
+    ) -> None:
+        self.state = state
+        self.started = started
+        # Mirror of the thread's running token total, decides when to compact
+        self.token_count = token_count
+        # Tokens of a thread checkpointed before the running total existed, sent with its next turn
+        self.token_backfill = token_backfill
+        self.lock = asyncio.Lock()
+        self.compaction: asyncio.Task | None = None
+        self.last_used = time.monotonic()
+        # Set after a failed turn or when the thread needs repair, the next turn
+        # reloads the fields above from the checkpoint under the lock
+        self.stale = stale
+
+    @property
+    def busy(self) -> bool:
+        """True while a turn or a background compaction is using the thread."""
+        return self.lock.locked() or (self.compaction is not None and not self.compaction.done())
+
+
+class SessionManager:
+    """Bounded cache of active game sessions keyed by LangGraph thread id.
+
+    Sessions are kept in LRU order and dropped once the cache is full or they have
+    been idle longer than the TTL. The checkpointer remains the source of truth, so
+    an evicted session is rebuilt lazily from its latest checkpoint on next use.
+
+    Attributes:
+        max_sessions (int): Maximum number of sessions kept in memory.
+        ttl_seconds (float): Idle time after which a session is evicted.
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float) -> None:
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.sessions: OrderedDict[str, Session] = OrderedDict()
+
+    def _evict(self, keep: str) -> None:
+        """Drops idle and least recently used sessions, never `keep` or a busy one.
+
+        Busy sessions and the one being handed out must keep their lock unique, so the
+        cache may stay over max_sessions until one of them frees up.
+        """
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if session_id == keep or session.busy:
+                continue
+            if now - session.last_used > self.ttl_seconds:
+                del self.sessions[session_id]
+        for session_id, session in list(self.sessions.items()):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if session_id != keep and not session.busy:
+                del self.sessions[session_id]
+
+    async def get(self, session_id: str, graph) -> Session:
+        """Returns the session for a thread id, hydrating it from the checkpointer on a miss.
+
+        Args:
+            session_id: LangGraph thread id of the game
+            graph: Compiled graph whose checkpointer holds the thread
+
+        Returns:
+            The active session
+        """
+        session = self.sessions.get(session_id)
+        if session is None:
+            fields = await self.hydrate(session_id, graph)
+            # Another turn may have hydrated the same thread while we were waiting
+            session = self.sessions.setdefault(session_id, Session(**fields))
+
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        self._evict(keep=session_id)
+        return session
+
+    async def hydrate(self, session_id: str, graph) -> dict:
+        """Reads what a session keeps outside the graph from the thread's latest checkpoint.
+
+        A thread left with unanswered tool calls comes back stale, the next turn repairs
+        it in refresh() under the session lock.
+        """
+        snapshot = await graph.aget_state({"configurable": {"thread_id": session_id}})
+        messages = snapshot.values.get("messages") or []
+        token_count = snapshot.values.get("token_count") or 0
+        token_backfill = 0
+        if messages and not token_count:
+            token_backfill = token_count = count_messages_tokens(messages)
+        return {
+            "state": GameState(players=snapshot.values.get("players") or []),
+            "started": bool(messages),
+            "token_count": token_count,
+            "token_backfill": token_backfill,
+            "stale": bool(repair_tool_calls(messages)[0]),
+        }
+
+    async def refresh(self, session_id: str, session: Session, graph) -> None:
+        """Rebuilds a stale session in place from the checkpointer.
+
+        Call with the session's lock held. The session object stays the one in the
+        cache, so turns already waiting on its lock and new ones share that lock.
+        """
+        fields = await self.hydrate(session_id, graph)
+        if fields["stale"]:
+            await self.repair(session_id, graph)
+            fields = await self.hydrate(session_id, graph)
+        session.state = fields["state"]
+        session.started = fields["started"]
+        session.token_count = fields["token_count"]
+        session.token_backfill = fields["token_backfill"]
+        session.stale = False
+
+    async def repair(self, session_id: str, graph) -> None:
+        """Closes the tool calls an interrupted turn left unanswered. Call with the session's lock held."""
+        config = {"configurable": {"thread_id": session_id}}
+        snapshot = await graph.aget_state(config)
+        updates, token_delta = repair_tool_calls(snapshot.values.get("messages") or [])
+        if not updates:
+            return
+        print(f"Session {session_id}: repairing tool calls left unanswered by an interrupted turn")
+        await graph.aupdate_state(
+            config,
+            {"messages": updates, "token_count": token_delta},
+            as_node="tools_node",
+        )
@@ -1,21 +1,67 @@
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+import os
+from pathlib import Path
 import aiosqlite
+from app.config.LoadAppConfig import LoadAppConfig
+from app.services.CompressedSerializer import ZstdSerializer
+from app.services.MessageLogSaver import MessageLogSqliteSaver
+
+CFG = LoadAppConfig()
 
 
 class SqliteService:
 
     def __init__(self):
+        # SQLITE_PATH (set by docker-compose) wins over the configured path
+        self.db_path = os.getenv("SQLITE_PATH") or CFG.checkpoint_db_path
         self.conn = None
+        self.reader_conns = []
         self.checkpointer = None
 
+    async def connect(self, read_only: bool = False) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path, check_same_thread=False)
+        if not read_only:
+            # Takes effect on a new database, existing ones are converted by the retention job when
+            # checkpoint.retention.convert_auto_vacuum is set
+            await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute(f"PRAGMA synchronous={CFG.checkpoint_synchronous}")
+        await conn.execute(f"PRAGMA mmap_size={int(CFG.checkpoint_mmap_size)}")
+        await conn.execute(f"PRAGMA cache_size={int(CFG.checkpoint_cache_size)}")
+        await conn.execute(f"PRAGMA busy_timeout={int(CFG.checkpoint_busy_timeout_ms)}")
+        await conn.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            await conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def make_serde(self) -> ZstdSerializer:
+        # Installed even with compression off so checkpoints compressed earlier stay readable
+        return ZstdSerializer(
+            # The dictionary travels with the database, frames compressed with it need it back
+            dict_path=f"{self.db_path}.dict",
+            compress=CFG.checkpoint_compression_enabled,
+            level=CFG.checkpoint_compression_level,
+            min_size=CFG.checkpoint_compression_min_size,
+            dict_size=CFG.checkpoint_compression_dictionary_size,
+            train_samples=CFG.checkpoint_compression_train_samples,
+        )
+
     async def init(self):
         if self.checkpointer:  # ✅ avoid re-init
             return
-        self.conn = await aiosqlite.connect("resource/db/checkpoint.db", check_same_thread=False)
-        self.checkpointer = AsyncSqliteSaver(self.conn)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = await self.connect()
+        self.reader_conns = [await self.connect(read_only=True) for _ in range(CFG.checkpoint_readers)]
+        self.checkpointer = MessageLogSqliteSaver(
+            self.conn,
+            self.reader_conns,
+            serde=self.make_serde(),
+            max_cached_threads=CFG.checkpoint_message_log_cache_threads,
+        )
         await self.checkpointer.setup()
 
     async def close(self):
+        for conn in self.reader_conns:
+            await conn.close()
         if self.conn:
             await self.conn.close()
 
@@ -1,8 +1,10 @@
+import asyncio
+import json
 import tiktoken
 import os
-from langchain_core.messages import BaseMessage, SystemMessage
+from collections import OrderedDict
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage, RemoveMessage
 from langchain_openai import ChatOpenAI
-from app.DTOs.GameState import GameState
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,53 +15,129 @@ LLM_MODEL_NAME = os.getenv("AZURE_DEPLOYMENT_NAME")
 ENCODER = tiktoken.encoding_for_model(LLM_MODEL_NAME.lower())
 TOKEN_LIMIT = 12000
 MESSAGES_TO_KEEP = 6
+TOKEN_CACHE_SIZE = 4096
+TOOL_OUTPUT_CHARS = 300
+SUMMARY_PREFIX = "Summary of previous conversation history:"
+
+# Shared by every summarization, building a client per call costs a new HTTP pool each time
+SUMMARIZER_LLM = ChatOpenAI(
+    model=LLM_MODEL_NAME,
+    base_url=BASE_URL,
+    api_key=LLM_API_KEY,
+    temperature=0.1,
+    timeout=300,
+)
+
+# Token counts memoized by message id, a message is encoded once no matter how often it is counted
+_token_cache: OrderedDict[str, int] = OrderedDict()
+
+def count_message_tokens(message: BaseMessage) -> int:
+    """Counts the tokens of a single message, memoized by message id."""
+    if message.id is not None and message.id in _token_cache:
+        _token_cache.move_to_end(message.id)
+        return _token_cache[message.id]
+
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    token_count = len(ENCODER.encode(content))
+    if message.id is not None:
+        _token_cache[message.id] = token_count
+        if len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return token_count
 
 def count_messages_tokens(messages: list[BaseMessage]) -> int:
     """Counts the total tokens in a list of BaseMessage objects."""
-    text = "\n".join([m.content for m in messages])
-    return len(ENCODER.encode(text))
-
-async def summarize_history_node(state: GameState) -> GameState:
-    messages: list[BaseMessage] = state["messages"]
-    
-    # Isolate messages to summarize (all but the most recent N)
-    old_messages = messages[:-MESSAGES_TO_KEEP]
-    recent_messages = messages[-MESSAGES_TO_KEEP:]
-    
-    llm_summarizer = ChatOpenAI(
-        model=LLM_MODEL_NAME,
-        base_url=BASE_URL,
-        api_key=LLM_API_KEY,
-        temperature=0.1,
-        timeout=300,
-    ) 
-
-    summary_text = await llm_summarizer.ainvoke(f"""Tóm tắt đoạn chat sau, 
-        giữ lại hết mức có thể nội dung chính và ngữ cảnh:
-        {old_messages}
+    return sum(count_message_tokens(m) for m in messages)
+
+def is_system_prompt(message: BaseMessage) -> bool:
+    """True for the init system message, as opposed to a summary of older history."""
+    return isinstance(message, SystemMessage) and not message.content.startswith(SUMMARY_PREFIX)
+
+def count_text_tokens(text: str) -> int:
+    """Counts the tokens of a plain string, such as the rolling summary."""
+    return len(ENCODER.encode(text)) if text else 0
+
+def render_transcript(messages: list[BaseMessage]) -> str:
+    """Renders messages as a compact "speaker: text" transcript for the summarizer."""
+    lines = []
+    for m in messages:
+        content = m.content if isinstance(m.content, str) else str(m.content)
+        if isinstance(m, HumanMessage):
+            lines.append(f"Players: {content}")
+        elif isinstance(m, ToolMessage):
+            lines.append(f"Tool {m.name}: {content[:TOOL_OUTPUT_CHARS]}")
+        elif isinstance(m, AIMessage):
+            if content:
+                lines.append(f"GM: {content}")
+            for tool_call in m.tool_calls:
+                lines.append(f"GM calls {tool_call['name']}: {json.dumps(tool_call['args'], ensure_ascii=False)}")
+        else:
+            lines.append(f"System: {content}")
+    return "\n".join(lines)
+
+def with_summary(messages: list[BaseMessage], summary: str | None) -> list[BaseMessage]:
+    """Places the rolling summary right after the init system prompt for the LLM call."""
+    if not summary:
+        return messages
+    head = messages[:1] if messages and is_system_prompt(messages[0]) else []
+    return head + [SystemMessage(content=f"{SUMMARY_PREFIX} {summary}")] + messages[len(head):]
+
+async def compact_history(graph, config: dict, lock: asyncio.Lock) -> int:
+    """Folds the messages added since the last summary into the rolling summary.
+
+    Runs after a turn has been delivered. The LLM call happens outside the
+    session lock, only the state update waits for it, so summarization never
+    delays a player-visible reply. Messages are removed by id, so anything
+    a newer turn added in the meantime is left untouched.
+
+    Args:
+        graph: Compiled graph whose checkpointer holds the thread
+        config: Config naming the thread to compact
+        lock: The session lock serializing turns on the thread
+
+    Returns:
+        The change applied to the thread's running token total
+    """
+    snapshot = await graph.aget_state(config)
+    messages: list[BaseMessage] = snapshot.values.get("messages") or []
+    previous_summary: str = snapshot.values.get("summary") or ""
+
+    # The init system prompt always stays in front
+    head = messages[:1] if messages and is_system_prompt(messages[0]) else []
+
+    # Isolate messages to summarize (all but the most recent N),
+    # never splitting tool results from the AI message that requested them
+    split = max(len(head), len(messages) - MESSAGES_TO_KEEP)
+    while split > len(head) and isinstance(messages[split], ToolMessage):
+        split -= 1
+    old_messages = messages[len(head):split]
+    if not old_messages:
+        return 0
+
+    summary_text = await SUMMARIZER_LLM.ainvoke(f"""Tóm tắt đoạn chat sau, 
+        giữ lại hết mức có thể nội dung chính và ngữ cảnh.
+        Tóm tắt trước đó:
+        {previous_summary}
+
+        Đoạn chat mới:
+        {render_transcript(old_messages)}
     """)
-    
-    summary_message = SystemMessage(
-        content=f"Summary of previous conversation history: {summary_text.content}"
+    summary = summary_text.content
+
+    token_delta = (
+        count_text_tokens(summary)
+        - count_text_tokens(previous_summary)
+        - count_messages_tokens(old_messages)
     )
-    
-    # Update the state: Summary + Recent Messages
-    new_messages = [summary_message] + recent_messages
-    state["messages"] = new_messages
-    print("Summarized chat")
-    return state
-
-def check_for_summarization(state: GameState) -> str:
-    """Routes to summarization if the context window is near the limit."""
-    messages = state.get("messages", [])
-    
-    if not messages:
-        return "continue" # Nothing to summarize
-        
-    token_count = count_messages_tokens(messages)
-    
-    if token_count > TOKEN_LIMIT:
-        return "summarize_history"
-    else:
-        # Continue to the main LLM call
-        return "continue"
\ No newline at end of file
+    async with lock:
+        await graph.aupdate_state(
+            config,
+            {
+                "messages": [RemoveMessage(id=m.id) for m in old_messages],
+                "summary": summary,
+                "token_count": token_delta,
+            },
+            as_node="main_chat_node",
+        )
+    print(f"Summarized chat: folded {len(old_messages)} messages into the summary")
+    return token_delta
@@ -1,34 +1,85 @@
+import asyncio
 import json
 from typing import Literal
-from langchain_core.messages import ToolMessage
+from langchain_core.messages import AIMessage, BaseMessage, RemoveMessage, ToolMessage
 from app.DTOs.GameState import GameState
+from app.services.SummarizerNode import count_messages_tokens
 
-class BasicToolNode:
-    """A node that runs the tools requested in the last AIMessage.
+class AsyncToolNode:
+    """A node that runs the tools requested in the last AIMessage concurrently.
 
     This class retrieves tool calls from the most recent AIMessage in the input
-    and invokes the corresponding tool to generate responses.
+    and invokes the corresponding tools together with `ainvoke`, so a monster
+    lookup and a story lookup in the same message don't wait on each other and
+    never block the event loop.
 
     Attributes:
         tools_by_name (dict): A dictionary mapping tool names to tool instances.
+        default_timeout (float): Seconds a tool may run before it is abandoned.
+        timeouts (dict): Per-tool overrides of `default_timeout`, keyed by tool name.
     """
 
-    def __init__(self, tools: list) -> None:
-        """Initializes the BasicToolNode with available tools.
+    def __init__(self, tools: list, default_timeout: float, timeouts: dict | None = None) -> None:
+        """Initializes the AsyncToolNode with available tools.
 
         Args:
             tools (list): A list of tool objects, each having a `name` attribute.
+            default_timeout (float): Seconds a tool may run before it is abandoned.
+            timeouts (dict | None): Per-tool overrides of `default_timeout`.
         """
         self.tools_by_name = {tool.name: tool for tool in tools}
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
 
-    def __call__(self, inputs: dict):
+    async def run_tool(self, tool_call: dict) -> ToolMessage:
+        """Runs a single tool call, turning timeouts and failures into error ToolMessages.
+
+        Every tool call must be answered by a ToolMessage with the same id,
+        otherwise the next LLM call is rejected, so errors are reported rather than raised.
+
+        Args:
+            tool_call (dict): The tool call with `name`, `args` and `id`.
+
+        Returns:
+            ToolMessage: The tool output, or an error description with status "error".
+        """
+        name = tool_call["name"]
+        timeout = self.timeouts.get(name, self.default_timeout)
+        try:
+            tool_result = await asyncio.wait_for(
+                self.tools_by_name[name].ainvoke(tool_call["args"]), timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"Tool {name} timed out after {timeout}s")
+            return ToolMessage(
+                content=f"Tool {name} timed out after {timeout} seconds",
+                name=name,
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+        except Exception as e:
+            print(f"Tool {name} failed: {e}")
+            return ToolMessage(
+                content=f"Tool {name} failed: {e}",
+                name=name,
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+        return ToolMessage(
+            content=json.dumps(tool_result),
+            name=name,
+            tool_call_id=tool_call["id"],
+        )
+
+    async def __call__(self, inputs: dict):
         """Executes the tools based on the tool calls in the last message.
 
         Args:
             inputs (dict): A dictionary containing the input state with messages.
 
         Returns:
-            dict: A dictionary with a list of `ToolMessage` outputs.
+            dict: A dictionary with a list of `ToolMessage` outputs, in tool call order,
+            and the tokens they add to the running total.
 
         Raises:
             ValueError: If no messages are found in the input.
@@ -37,19 +88,58 @@ class BasicToolNode:
             message = messages[-1]
         else:
             raise ValueError("No message found in input")
-        outputs = []
-        for tool_call in message.tool_calls:
-            tool_result = self.tools_by_name[tool_call["name"]].invoke(
-                tool_call["args"]
-            )
-            outputs.append(
+        # gather keeps results in the order of the tool calls
+        outputs = await asyncio.gather(
+            *(self.run_tool(tool_call) for tool_call in message.tool_calls)
+        )
+        return {"messages": list(outputs), "token_count": count_messages_tokens(outputs)}
+
+
+def repair_tool_calls(messages: list[BaseMessage]) -> tuple[list[BaseMessage], int]:
+    """Finds tool calls no ToolMessage answers and the updates that close them.
+
+    A turn cut short between the Game Master's tool call and its results (a crash
+    before the tool step was saved, a client leaving mid-stream) leaves such a call
+    behind, and the LLM rejects every later request on the thread. Calls of the last
+    AIMessage get error ToolMessages, so the Game Master learns the tool was interrupted.
+    An older AIMessage, already followed by other messages, is removed with its partial
+    results since nothing can be inserted after it.
+
+    Args:
+        messages (list): The thread's messages, oldest first.
+
+    Returns:
+        tuple: The messages update, empty when every call is answered, and the change
+        it makes to the running token total.
+    """
+    answered = {m.tool_call_id for m in messages if isinstance(m, ToolMessage)}
+    last_ai = max((i for i, m in enumerate(messages) if isinstance(m, AIMessage)), default=None)
+    updates: list[BaseMessage] = []
+    token_delta = 0
+    for i, message in enumerate(messages):
+        if not isinstance(message, AIMessage):
+            continue
+        unanswered = [call for call in message.tool_calls if call["id"] not in answered]
+        if not unanswered:
+            continue
+        if i == last_ai and all(isinstance(m, ToolMessage) for m in messages[i + 1:]):
+            results = [
                 ToolMessage(
-                    content=json.dumps(tool_result),
-                    name=tool_call["name"],
-                    tool_call_id=tool_call["id"],
+                    content=f"Tool {call['name']} was interrupted before it finished",
+                    name=call["name"],
+                    tool_call_id=call["id"],
+                    status="error",
                 )
-            )
-        return {"messages": outputs}
+                for call in unanswered
+            ]
+            updates.extend(results)
+            token_delta += count_messages_tokens(results)
+        else:
+            call_ids = {call["id"] for call in message.tool_calls}
+            removed = [message] + [m for m in messages if isinstance(m, ToolMessage) and m.tool_call_id in call_ids]
+            updates.extend(RemoveMessage(id=m.id) for m in removed)
+            token_delta -= count_messages_tokens(removed)
+    return updates, token_delta
 
 
 def route_tools(
@@ -0,0 +1,105 @@
+import os
+import threading
+import chromadb
+from chromadb.config import Settings
+from langchain_chroma import Chroma
+from langchain_openai import OpenAIEmbeddings
+from app.config.LoadAppConfig import LoadAppConfig
+from app.services.EmbeddingCache import CachedEmbeddings, embedding_cache
+from dotenv import load_dotenv
+
+load_dotenv()
+CFG = LoadAppConfig()
+
+
+class VectorStoreRegistry:
+    """Process-wide pool of warm Chroma collection handles.
+
+    Opening a collection means building a Chroma wrapper, an embeddings client
+    and loading the HNSW index from disk. The registry does that once per
+    collection and hands the same handle to every tool call afterwards.
+
+    Attributes:
+        handles (dict): A dictionary mapping collection names to Chroma vector stores.
+    """
+
+    def __init__(self) -> None:
+        self.client = None
+        self.embedding_function = None
+        self.handles: dict[str, Chroma] = {}
+        self._lock = threading.Lock()
+
+    def _ensure_client(self) -> None:
+        if self.client is None:
+            self.client = chromadb.PersistentClient(
+                path=CFG.rag_vectordb_directory,
+                settings=Settings(anonymized_telemetry=False)
+            )
+            self.embedding_function = CachedEmbeddings(
+                OpenAIEmbeddings(
+                    model=CFG.rag_embedding_model,
+                    base_url=os.getenv("AZURE_OPENAI_ENDPOINT"),
+                    api_key=os.getenv("AZURE_EMBEDDING_API_KEY")
+                ),
+                model=CFG.rag_embedding_model,
+                cache=embedding_cache,
+            )
+
+    def get(self, collection_name: str) -> Chroma:
+        """Returns the shared handle for a collection, opening it on first use.
+
+        Args:
+            collection_name (str): The name of the collection inside the vector database.
+
+        Returns:
+            Chroma: A long-lived vector store bound to the collection.
+        """
+        vectordb = self.handles.get(collection_name)
+        if vectordb is not None:
+            return vectordb
+
+        with self._lock:
+            # Another thread may have opened it while we waited for the lock
+            if collection_name not in self.handles:
+                self._ensure_client()
+                self.handles[collection_name] = Chroma(
+                    client=self.client,
+                    collection_name=collection_name,
+                    embedding_function=self.embedding_function,
+                )
+            return self.handles[collection_name]
+
+    def warmup(self, collection_name: str) -> int:
+        """Opens a collection and forces its HNSW index into memory.
+
+        Chroma loads the index lazily on the first query, so a nearest neighbour
+        lookup with a stored vector is issued here instead of on a player's turn.
+
+        Args:
+            collection_name (str): The name of the collection to pre-load.
+
+        Returns:
+            int: The number of vectors in the collection.
+        """
+        collection = self.get(collection_name)._collection
+        count = collection.count()
+        if count:
+            sample = collection.get(limit=1, include=["embeddings"])
+            collection.query(query_embeddings=sample["embeddings"], n_results=1)
+        print(f"Vector store '{collection_name}' ready with {count} vectors")
+        return count
+
+    def init(self) -> None:
+        """Opens and warms every RAG collection used by the game master tools."""
+        for collection_name in (
+            CFG.monster_rag_collection_name,
+            CFG.player_rag_collection_name,
+            CFG.phandelverstory_rag_collection_name,
+        ):
+            try:
+                self.warmup(collection_name)
+            except Exception as e:
+                print(f"Error warming up vector store '{collection_name}': {e}")
+
+
+vectorstore_registry = VectorStoreRegistry()
@@ -0,0 +1,55 @@
+from collections.abc import Callable
+import orjson
+import ormsgpack
+
+# Websocket subprotocols a client can ask for, by order of preference in its handshake.
+# JSON goes out as text frames, msgpack as binary frames.
+ENCODERS: dict[str, Callable[[dict], str | bytes]] = {
+    "json": lambda event: orjson.dumps(event).decode(),
+    "msgpack": ormsgpack.packb,
+}
+# Used when the client asks for no protocol, or only for ones we do not speak
+DEFAULT_PROTOCOL = "json"
+
+
+def negotiate(offered: list[str]) -> str | None:
+    """Picks the first protocol of the client's handshake that the server speaks.
+
+    Args:
+        offered: Sec-WebSocket-Protocol values sent by the client
+
+    Returns:
+        The protocol to accept the connection with, None to answer without one
+    """
+    for protocol in offered:
+        if protocol in ENCODERS:
+            return protocol
+    return None
+
+
+def decode(payload: str | bytes) -> dict:
+    """Reads a client frame, text frames are JSON and binary frames msgpack."""
+    if isinstance(payload, bytes):
+        return ormsgpack.unpackb(payload)
+    return orjson.loads(payload)
+
+
+class Frame:
+    """An event sent to many clients, encoded at most once per protocol however many receive it.
+
+    Attributes:
+        event (dict): The event as sent to the clients.
+        encoded (dict): Encodings made so far keyed by protocol.
+    """
+
+    __slots__ = ("event", "encoded")
+
+    def __init__(self, event: dict) -> None:
+        self.event = event
+        self.encoded: dict[str, str | bytes] = {}
+
+    def encode(self, protocol: str) -> str | bytes:
+        data = self.encoded.get(protocol)
+        if data is None:
+            data = self.encoded[protocol] = ENCODERS[protocol](self.event)
+        return data
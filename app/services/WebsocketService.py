@@ -1,12 +1,125 @@
-import os
-import websockets
 import asyncio
-import json
+import itertools
+from collections import OrderedDict, deque
+import orjson
 from fastapi import WebSocket, WebSocketDisconnect
+from app.config.LoadAppConfig import LoadAppConfig
+from app.services.BroadcastBackend import WORKER_ID
+from app.services.EventBus import event_bus, room_owner_key, room_sync_topic, room_topic
+from app.services.RateLimiter import RateLimit, allow
+from app.services.WebsocketProtocol import DEFAULT_PROTOCOL, ENCODERS, Frame, decode, negotiate
+
+CFG = LoadAppConfig()
+
+# Client object fields that stay on the server
+PRIVATE_CLIENT_KEYS = ("websocket", "room", "queue", "writer", "joined", "protocol", "rate_limit", "throttled_until")
+# Frames not sent by a player
+SERVER_SENDERS = ("GAME_MASTER", "STATUS")
+# Frames not kept for replay, the CHAT frame closing the turn carries the whole reply
+TRANSIENT_TYPES = ("CHAT_DELTA",)
+# Tells apart the replay buffers a worker creates over its lifetime
+REPLAY_EPOCHS = itertools.count(1)
+
+
+class ReplayBuffer:
+    """The newest frames delivered to a room, numbered so a reconnecting client can get back what it missed.
+
+    Sequence numbers are given on delivery by this worker and only mean something
+    together with the buffer's epoch. A client resuming on another worker, or after
+    this one restarted, is told it missed too much rather than sent the wrong frames.
+
+    Attributes:
+        epoch (str): Identifies this buffer, sent with the snapshots and RESUME replies.
+        seq (int): Sequence number of the newest frame.
+        frames (deque): (seq, frame) of the newest frames, oldest first.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.epoch = f"{WORKER_ID}-{next(REPLAY_EPOCHS)}"
+        self.seq = 0
+        self.frames: deque[tuple[int, Frame]] = deque(maxlen=size)
+
+    def append(self, event: dict) -> Frame:
+        """Numbers a frame and keeps it, along with the encodings made for its recipients."""
+        self.seq += 1
+        frame = Frame({**event, "seq": self.seq})
+        self.frames.append((self.seq, frame))
+        return frame
+
+    def since(self, seq: int) -> list[Frame] | None:
+        """Returns the frames numbered after `seq`, None when some of them are no longer kept."""
+        if seq > self.seq:
+            return None
+        oldest = self.frames[0][0] if self.frames else self.seq + 1
+        if seq + 1 < oldest:
+            return None
+        # Numbers are consecutive, the first missed frame is at a known offset
+        return [frame for _, frame in itertools.islice(self.frames, seq + 1 - oldest, None)]
+
+
+class Room:
+    """A game table: the connections playing together and the thread their turns run on.
+
+    With several workers a room exists on every worker that has members in it. Each
+    one follows the members of the others from the room's events, the worker holding
+    the room's ownership lease runs the turns.
+
+    Attributes:
+        room_id (str): Room id, also the LangGraph thread id of its game.
+        clients (dict): Client objects of the members on this worker keyed by connection id.
+        remote_clients (dict): Public view of the members on other workers keyed by connection id.
+        lock (asyncio.Lock): Held while a turn of this room runs.
+        turn_signal (asyncio.Event): Set on every player event, wakes the room's turn scheduler.
+        round_opened (float | None): Loop time of the first message since the last turn started.
+        scheduler (asyncio.Task): The room's turn scheduler, see `WebSocketService.schedule_turns`.
+        handler (Callable): Event bus subscription delivering the room topic to the members.
+        sync_handler (Callable): Event bus subscription answering other workers' roster requests.
+        openai_service: Chat service the room's turns run on.
+        presence_version (int): Number of presence deltas delivered, snapshots carry it so
+            clients can drop deltas they already have.
+        replay (ReplayBuffer): Frames kept for members coming back after a dropped connection.
+        rate_limit (RateLimit): Frames the members on this worker may send together.
+    """
+
+    def __init__(self, room_id: str, replay: ReplayBuffer) -> None:
+        self.room_id = room_id
+        self.clients: dict[str, dict] = {}
+        self.remote_clients: dict[str, dict] = {}
+        self.lock = asyncio.Lock()
+        self.turn_signal = asyncio.Event()
+        self.round_opened: float | None = None
+        self.scheduler: asyncio.Task | None = None
+        self.handler = None
+        self.sync_handler = None
+        self.openai_service = None
+        self.presence_version = 0
+        self.replay = replay
+        self.rate_limit = RateLimit(**CFG.ws_rate_limit_room)
+
+    @property
+    def owner_key(self) -> str:
+        return room_owner_key(self.room_id)
+
+    def players(self) -> list[dict]:
+        """Every member of the room, on this worker or another one."""
+        return list(self.clients.values()) + list(self.remote_clients.values())
+
+    def round_complete(self) -> bool:
+        players = self.players()
+        return bool(players) and all(client["message"] != "" for client in players)
+
+    def pending(self) -> list[dict]:
+        """Members who have spoken since the last turn started."""
+        return [client for client in self.players() if client["message"] != ""]
+
 
 class WebSocketService:
     def __init__(self):
-        self.connected_clients = []
+        self.rooms: dict[str, Room] = {}
+        # Replay buffers of rooms that emptied, a member reconnecting finds its frames here
+        self.idle_replays: OrderedDict[str, ReplayBuffer] = OrderedDict()
+        # Keeps fire-and-forget tasks referenced until they finish
+        self.background_tasks: set[asyncio.Task] = set()
 
     def remove_websocket_list_dic(self, data_list):
         filtered_data = []
@@ -16,38 +129,229 @@ class WebSocketService:
         return filtered_data
 
     def remove_websocket_dic(self, data):
-        filtered_data = {k: v for k, v in data.items() if k != 'websocket'}
+        filtered_data = {k: v for k, v in data.items() if k not in PRIVATE_CLIENT_KEYS}
         return filtered_data
 
-    async def handle_connect(self, websocket: WebSocket):
-        await websocket.accept()
-        websocket_id = hex(id(websocket))
+    def send(self, client_obj: dict, data: str | bytes):
+        """Queues an encoded frame for one client, a client whose queue is full is dropped."""
+        try:
+            client_obj["queue"].put_nowait(data)
+        except asyncio.QueueFull:
+            print(f"Client {client_obj['id']} is too slow, send queue full")
+            # Dropping announces LEFT and PRESENCE_REMOVE to the room. Done right away from
+            # inside deliver(), the members after this one would get them before the frame
+            # being delivered, out of seq order.
+            asyncio.get_running_loop().call_soon(self.drop, client_obj, "Send queue overflow")
+
+    def send_event(self, client_obj: dict, event: dict):
+        """Encodes an event for the one client it is meant for and queues it."""
+        self.send(client_obj, ENCODERS[client_obj["protocol"]](event))
+
+    def broadcast(self, room: Room, message: dict):
+        # Goes through the bus like the REST replies, the room's subscription fans it out
+        event_bus.publish(room_topic(room.room_id), self.remove_websocket_dic(message))
+
+    def deliver(self, room: Room, event: dict):
+        self.track(room, event)
+        if event.get("type", "").startswith("PRESENCE_"):
+            # Stamped on delivery, the order every worker receives the room's events in
+            room.presence_version += 1
+            event = {**event, "version": room.presence_version}
+        # Encoded once per protocol, the members speaking it are sent the same payload
+        frame = Frame(event) if event.get("type") in TRANSIENT_TYPES else room.replay.append(event)
+        for client in list(room.clients.values()):
+            self.send(client, frame.encode(client["protocol"]))
+        if event.get("id") not in SERVER_SENDERS:
+            if room.round_opened is None and room.pending():
+                room.round_opened = asyncio.get_running_loop().time()
+            room.turn_signal.set()
+
+    def track(self, room: Room, event: dict):
+        """Follows the round from the room's events, members on other workers included."""
+        sender = event.get("id")
+        if sender == "GAME_MASTER":
+            if event.get("type") == "THINKING" and event.get("message") == "START" and event.get("worker") != WORKER_ID:
+                # Whichever worker runs the turn, the round's messages are consumed. The one
+                # running it already did, what arrived since belongs to the next round.
+                for client in room.players():
+                    client["message"] = ""
+                room.round_opened = None
+            return
+        if sender in SERVER_SENDERS or str(sender).startswith(f"{WORKER_ID}-"):
+            return
+        if event.get("type") == "LEFT":
+            room.remote_clients.pop(sender, None)
+            return
+        remote = self.remove_websocket_dic(event)
+        previous = room.remote_clients.get(sender)
+        if event.get("type") == "CHAT" and previous and previous["message"]:
+            # Several messages before the turn starts make up one action, as on the sender's worker
+            remote["message"] = f"{previous['message']}\n{remote['message']}"
+        room.remote_clients[sender] = remote
+
+    def handle_sync(self, room: Room, event: dict):
+        """Shares this worker's members with a worker that just started serving the room."""
+        if event.get("worker") == WORKER_ID:
+            return
+        if event.get("type") == "SYNC_REQUEST" and room.clients:
+            sync = {
+                "type": "SYNC",
+                "worker": WORKER_ID,
+                "clients": self.remove_websocket_list_dic(list(room.clients.values())),
+            }
+            event_bus.publish(room_sync_topic(room.room_id), sync)
+        elif event.get("type") == "SYNC":
+            for client in event.get("clients", []):
+                room.remote_clients[client["id"]] = client
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def write_loop(self, client_obj: dict):
+        """Drains one client's send queue, so a slow client only ever delays itself."""
+        websocket = client_obj["websocket"]
+        queue = client_obj["queue"]
+        try:
+            while True:
+                data = await queue.get()
+                if isinstance(data, bytes):
+                    send = websocket.send_bytes(data)
+                else:
+                    send = websocket.send_text(data)
+                await asyncio.wait_for(send, CFG.ws_send_timeout_seconds)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print("Send error:", e)
+            self.drop(client_obj, "Send failed")
+
+    def drop(self, client_obj: dict, reason: str):
+        """Removes a client that cannot keep up and closes its socket in the background."""
+        room = client_obj["room"]
+        if room.clients.get(client_obj["id"]) is not client_obj:
+            return
+        self.leave(room, client_obj["id"])
+        self.announce_left(room, client_obj)
+        self.spawn(self.close(client_obj["websocket"], reason))
+
+    async def close(self, websocket: WebSocket, reason: str):
+        try:
+            # 1008: policy violation, the client did not read its frames in time
+            await websocket.close(code=1008, reason=reason)
+        except Exception as e:
+            print("Close error:", e)
+
+    def send_status(self, client_obj: dict):
+        """Sends the full member list to one client, on join or when it asks for a resync."""
+        room = client_obj["room"]
+        status = {
+            "id": "STATUS",
+            "user": "STATUS",
+            "type": "STATUS",
+            "version": room.presence_version,
+            "epoch": room.replay.epoch,
+            "seq": room.replay.seq,
+            "message": orjson.dumps(self.remove_websocket_list_dic(room.players())).decode()
+        }
+        self.send_event(client_obj, status)
+
+    def resume(self, client_obj: dict, epoch: str, seq: int):
+        """Sends a reconnecting client the room frames it missed.
+
+        Args:
+            client_obj: The client's new connection
+            epoch: Epoch of the replay buffer the client last received frames from
+            seq: Sequence number of the last frame it received
+
+        The missed frames are followed by a RESUMED frame, or by a RESUME_GAP frame
+        alone when they can no longer all be sent; the client then asks for a RESYNC.
+        """
+        replay = client_obj["room"].replay
+        frames = replay.since(seq) if epoch == replay.epoch and isinstance(seq, int) else None
+        queue = client_obj["queue"]
+        if frames is not None and len(frames) > queue.maxsize - queue.qsize():
+            # Replaying would overflow the send queue and drop the client again
+            frames = None
+        for frame in frames or []:
+            self.send(client_obj, frame.encode(client_obj["protocol"]))
+        resumed = {
+            "id": "STATUS",
+            "user": "STATUS",
+            "type": "RESUME_GAP" if frames is None else "RESUMED",
+            "epoch": replay.epoch,
+            "seq": replay.seq,
+            "message": "" if frames is None else str(len(frames))
+        }
+        self.send_event(client_obj, resumed)
+
+    def send_presence(self, room: Room, presence_type: str, client_obj: dict):
+        """Tells the room about one member, PRESENCE_ADD / PRESENCE_UPDATE / PRESENCE_REMOVE."""
+        presence = {
+            "id": "STATUS",
+            "user": "STATUS",
+            "type": presence_type,
+            "message": orjson.dumps(self.remove_websocket_dic(client_obj)).decode()
+        }
+        self.broadcast(room, presence)
+
+    async def handle_connect(self, websocket: WebSocket, room_id: str = CFG.ws_default_room):
+        # JSON unless the client's handshake asks for a protocol we speak, e.g. new WebSocket(url, ["msgpack"])
+        protocol = negotiate(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=protocol)
+        # Unique across workers, other workers tell members apart by it
+        websocket_id = f"{WORKER_ID}-{hex(id(websocket))}"
+        room = self.rooms.get(room_id)
+        if room is None:
+            replay = self.idle_replays.pop(room_id, None) or ReplayBuffer(CFG.ws_replay_size)
+            room = self.rooms[room_id] = Room(room_id, replay)
+            room.handler = lambda event: self.deliver(room, event)
+            room.sync_handler = lambda event: self.handle_sync(room, event)
+            event_bus.subscribe(room_topic(room_id), room.handler)
+            event_bus.subscribe(room_sync_topic(room_id), room.sync_handler)
+            event_bus.publish(room_sync_topic(room_id), {"type": "SYNC_REQUEST", "worker": WORKER_ID})
+            room.scheduler = asyncio.create_task(self.schedule_turns(room))
         client_obj = {
             "id": websocket_id,
             "user": websocket_id,
             "type": "",
             "message": "",
-            "websocket": websocket
+            "websocket": websocket,
+            "room": room,
+            "queue": asyncio.Queue(maxsize=CFG.ws_send_queue_size),
+            "protocol": protocol or DEFAULT_PROTOCOL,
+            "rate_limit": RateLimit(**CFG.ws_rate_limit_connection),
         }
-        self.connected_clients.append(client_obj)
+        client_obj["writer"] = asyncio.create_task(self.write_loop(client_obj))
+        room.clients[websocket_id] = client_obj
         return client_obj
 
     async def handle_receive(self, websocket, client_obj, openai_service):
-        websocket_id = hex(id(websocket))
+        websocket_id = client_obj["id"]
+        room = client_obj["room"]
+        room.openai_service = openai_service
         try:
             while True:
-                data_text = await websocket.receive_text()
-                print(f"Server received: {data_text}")
+                received = await websocket.receive()
+                if received["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(received.get("code", 1000))
+                payload = received["text"] if received.get("text") is not None else received.get("bytes")
+                # Checked before parsing, a flood costs no more than reading it off the socket
+                size = len(payload.encode()) if isinstance(payload, str) else len(payload)
+                retry_after = allow([client_obj["rate_limit"], room.rate_limit], size)
+                if retry_after:
+                    self.throttle(client_obj, retry_after)
+                    continue
+                print(f"Server received in room {room.room_id}: {payload}")
 
-                # Parse JSON message
+                # Parse JSON text frames or msgpack binary frames, whatever the negotiated protocol
                 try:
-                    data = json.loads(data_text)
+                    data = decode(payload)
                 except Exception as e:
-                    error_msg = f"JSON parse error: {str(e)}. Message must be like: {{\"user\": str, \"type\": str, \"message\": str}} (type: JOIN/CHAT)"
-                    try:
-                        await websocket.send_text(error_msg)
-                    except Exception as err:
-                        print("Send error to client:", err)
+                    error_msg = f"Parse error: {str(e)}. Message must be like: {{\"user\": str, \"type\": str, \"message\": str}} (type: JOIN/CHAT), as JSON text or msgpack binary"
+                    self.send(client_obj, error_msg)
                     continue
 
                 json_user = data.get("user", websocket_id)
@@ -56,138 +360,209 @@ class WebSocketService:
 
                 if json_type == "PING":
                     print(f"PING SERVER")
-                else:    
-                    closed_clients = []
-                    # Broadcast logic
-                    for client in self.connected_clients:
-                        if client["id"] == websocket_id:
-                            client["user"] = json_user
-                            client["type"] = json_type
-                            if json_type == "JOIN":
-                                client["message"] = ""
-                                status = {
-                                    "id": "STATUS",
-                                    "user": "STATUS",
-                                    "type": "STATUS",
-                                    "message": json.dumps(self.remove_websocket_list_dic(self.connected_clients))
-                                }
-                                for joiner in self.connected_clients:
-                                    try:
-                                        await joiner["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(status))}")
-                                    except Exception as e:
-                                        print("Send error:", e)
-                            elif json_type == "CHAT":
-                                client["message"] = json_message
-                            else:
-                                client["message"] = f"Unknown type: {json_type}"
-
-                    all_have_message = all(client["message"] != "" for client in self.connected_clients)
-
-                    if all_have_message:
-                        for client in self.connected_clients:
-                            try:
-                                await client["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(client_obj))}")
-                                print("Sent message: '", client_obj, "' to client:", websocket_id)
-                                start_thinking = {
-                                    "id": "GAME_MASTER",
-                                    "user": "GAME_MASTER",
-                                    "type": "THINKING",
-                                    "message": "START"
-                                }
-                                await client["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(start_thinking))}")
-                            except Exception as e:
-                                print("Send error:", e)
-                                closed_clients.append(websocket_id)
-
-                        # call OpenAPI here
-                        user_messages = [(client["user"], client["message"]) for client in self.connected_clients]
-                        combined_text = "\n".join(f"{user}: {msg}\n" for user, msg in user_messages)
-                        reply = await openai_service.chat(combined_text, "user-123")
-                        # end call OpenAPI here
-
-                        for client in self.connected_clients:
-                            try:
-                                end_thinking = {
-                                    "id": "GAME_MASTER",
-                                    "user": "GAME_MASTER",
-                                    "type": "THINKING",
-                                    "message": "END"
-                                }
-                                await client["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(end_thinking))}")
-
-                                game_master_respone = {
-                                    "id": "GAME_MASTER",
-                                    "user": "GAME_MASTER",
-                                    "type": "CHAT",
-                                    "message": reply
-                                }
-                                await client["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(game_master_respone))}")
-                                client["message"] = ""
-                                print("Sent message: '", game_master_respone, "' to client:", websocket_id)
-                            except Exception as e:
-                                print("Send error:", e)
-                                closed_clients.append(websocket_id)
+                    continue
+                if json_type == "RESYNC":
+                    self.send_status(client_obj)
+                    continue
+                if json_type == "RESUME":
+                    self.resume(client_obj, data.get("epoch"), data.get("seq"))
+                    continue
+
+                client_obj["user"] = json_user
+                client_obj["type"] = json_type
+                if json_type == "JOIN":
+                    client_obj["message"] = ""
+                    self.send_presence(room, "PRESENCE_UPDATE" if client_obj.get("joined") else "PRESENCE_ADD", client_obj)
+                    client_obj["joined"] = True
+                    self.send_status(client_obj)
+                elif json_type == "CHAT":
+                    # Messages sent before the turn starts are played together
+                    if client_obj["message"]:
+                        client_obj["message"] = f"{client_obj['message']}\n{json_message}"
                     else:
-                        for client in self.connected_clients:
-                            try:
-                                await client["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(client_obj))}")
-                                print("Sent message: '", client_obj, "' to client:", websocket_id)
-                            except Exception as e:
-                                print("Send error:", e)
-                                closed_clients.append(websocket_id)
-
-                    # Remove disconnected clients
-                    for close in closed_clients:
-                        for client in self.connected_clients:
-                            if client["id"] == close:
-                                self.connected_clients.remove(client)
+                        client_obj["message"] = json_message
+                else:
+                    client_obj["message"] = f"Unknown type: {json_type}"
+
+                # The room's scheduler starts the turn, the frame only carries this message
+                self.broadcast(room, {**client_obj, "message": json_message} if json_type == "CHAT" else client_obj)
         except WebSocketDisconnect:
-            await self.handle_disconnect(websocket, websocket_id)
+            await self.handle_disconnect(websocket, websocket_id, room)
         except Exception as e:
             print("Other error:", e)
-            for client in self.connected_clients[:]:
-                if client["websocket"] == websocket:
-                    self.connected_clients.remove(client)
-                print(f"Client removed. Connected_clients: {(self.connected_clients)}")
+            await self.handle_disconnect(websocket, websocket_id, room)
 
-    async def handle_disconnect(self, websocket, websocket_id):
-        print(f"Client disconnected: {websocket_id}")
-        disconnected_clients = next(
-            (client for client in self.connected_clients if client["id"] == websocket_id),
-            None
-        )
-        if disconnected_clients:
-            disconnected_clients["type"] = "LEFT"
-        for client in self.connected_clients[:]:
-            if client["websocket"] == websocket:
-                self.connected_clients.remove(client)
-            else:
-                await client["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(disconnected_clients))}")
-            print(f"Client removed. Connected_clients: {(self.connected_clients)}")
-
-        status = {
+    def throttle(self, client_obj: dict, retry_after: float):
+        """Tells a client its frame was dropped, at most once a second so a flood is not echoed back."""
+        now = asyncio.get_running_loop().time()
+        if now < client_obj.get("throttled_until", 0):
+            return
+        client_obj["throttled_until"] = now + min(retry_after, 1.0)
+        too_large = retry_after == float("inf")
+        throttled = {
             "id": "STATUS",
             "user": "STATUS",
-            "type": "STATUS",
-            "message": json.dumps(self.remove_websocket_list_dic(self.connected_clients))
+            "type": "THROTTLED",
+            "message": "Frame larger than the rate limit allows" if too_large else "Too many frames, slow down",
+            "retry_after": None if too_large else round(retry_after, 3)
         }
-        for joiner in self.connected_clients:
+        self.send_event(client_obj, throttled)
+
+    async def schedule_turns(self, room: Room):
+        """Starts the room's turns, one at a time, outside of any client's receive loop.
+
+        A round opens with the first message after the previous turn started. Its turn
+        starts as soon as every member has spoken, or `turn_deadline_seconds` after the
+        round opened with the members who did. Messages arriving while the Game Master
+        answers open the next round, which starts once that turn is over.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await room.turn_signal.wait()
+            room.turn_signal.clear()
+            if not room.pending():
+                continue
+            opened = room.round_opened if room.round_opened is not None else loop.time()
+            deadline = None if CFG.ws_turn_deadline_seconds is None else opened + CFG.ws_turn_deadline_seconds
+            while not room.round_complete() and room.pending():
+                timeout = None if deadline is None else deadline - loop.time()
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(room.turn_signal.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                room.turn_signal.clear()
+            try:
+                await self.play_turn(room, room.openai_service)
+            except Exception as e:
+                print(f"Turn scheduler error in room {room.room_id}: {e}")
+
+    async def play_turn(self, room: Room, openai_service):
+        """Runs one Game Master turn on the room's thread with the members who have spoken."""
+        async with room.lock:
+            # The turn may already have been played by the worker owning the room
+            if not room.pending():
+                return
+            # Every worker serving the room schedules the turn, only the owner plays it
+            lease_ms = int(CFG.ws_broadcast_lease_seconds * 1000)
+            try:
+                if not await event_bus.backend.claim(room.owner_key, WORKER_ID, lease_ms):
+                    return
+            except Exception as e:
+                print(f"Room {room.room_id} ownership error: {e}")
+                return
+            user_messages = [(client["user"], client["message"]) for client in room.pending()]
+            # Messages sent while the Game Master thinks belong to the next round
+            for client in room.players():
+                client["message"] = ""
+            room.round_opened = None
+
+            start_thinking = {
+                "id": "GAME_MASTER",
+                "user": "GAME_MASTER",
+                "type": "THINKING",
+                "message": "START",
+                "worker": WORKER_ID
+            }
+            self.broadcast(room, start_thinking)
+
+            # call OpenAPI here
+            combined_text = "\n".join(f"{user}: {msg}\n" for user, msg in user_messages)
             try:
-                await joiner["websocket"].send_text(f"{json.dumps(self.remove_websocket_dic(status))}")
+                # Renewed while the turn runs, another worker must not play the thread meanwhile
+                async with event_bus.hold_lease(room.owner_key, WORKER_ID, lease_ms):
+                    if CFG.ws_stream_tokens:
+                        reply = await self.stream_reply(openai_service, combined_text, room)
+                    else:
+                        reply = await openai_service.chat(combined_text, room.room_id)
             except Exception as e:
-                print("Send error:", e)
+                print(f"Turn error in room {room.room_id}: {e}")
+                reply = f"Game Master error: {e}"
+            # end call OpenAPI here
+
+            end_thinking = {
+                "id": "GAME_MASTER",
+                "user": "GAME_MASTER",
+                "type": "THINKING",
+                "message": "END"
+            }
+            self.broadcast(room, end_thinking)
+            game_master_respone = {
+                "id": "GAME_MASTER",
+                "user": "GAME_MASTER",
+                "type": "CHAT",
+                "message": reply
+            }
+            self.broadcast(room, game_master_respone)
+            print("Sent message: '", game_master_respone, "' to room:", room.room_id)
+            # Keep the room on this worker for the next round
+            await event_bus.backend.claim(room.owner_key, WORKER_ID, lease_ms)
+
+    async def stream_reply(self, openai_service, combined_text: str, room: Room) -> str:
+        """Forwards Game Master tokens to the room as CHAT_DELTA frames and returns the full reply."""
+        reply = ""
+        async for event in openai_service.stream_chat(combined_text, room.room_id):
+            if event["event"] == "message":
+                reply = event["data"]
+            if event["event"] != "token":
+                continue
+            game_master_delta = {
+                "id": "GAME_MASTER",
+                "user": "GAME_MASTER",
+                "type": "CHAT_DELTA",
+                "message": event["data"]
+            }
+            self.broadcast(room, game_master_delta)
+        return reply
+
+    def leave(self, room: Room, websocket_id: str):
+        client_obj = room.clients.pop(websocket_id, None)
+        if client_obj is not None and client_obj["writer"] is not asyncio.current_task():
+            client_obj["writer"].cancel()
+        # Forget empty rooms, the game itself stays in the checkpointer
+        if not room.clients:
+            if room.lock.locked():
+                # Keep the room through the running turn, its narration goes to the replay buffer
+                self.spawn(self.close_after_turn(room))
+            else:
+                self.close_room(room)
+
+    async def close_after_turn(self, room: Room):
+        async with room.lock:
+            pass
+        if not room.clients:
+            self.close_room(room)
 
-    async def client_send_message(self, message: str):
-        WS_ENDPOINT = os.getenv("WS_ENDPOINT", "ws://localhost:8000/ws")
-        WS_RECONNECT_INTERVAL = int(os.getenv("WS_RECONNECT_INTERVAL", 5))
+    def close_room(self, room: Room):
+        if self.rooms.get(room.room_id) is room:
+            del self.rooms[room.room_id]
+            event_bus.unsubscribe(room_topic(room.room_id), room.handler)
+            event_bus.unsubscribe(room_sync_topic(room.room_id), room.sync_handler)
+            room.scheduler.cancel()
+            self.spawn(self.release(room))
+            self.idle_replays[room.room_id] = room.replay
+            while len(self.idle_replays) > CFG.ws_replay_idle_rooms:
+                self.idle_replays.popitem(last=False)
 
+    async def release(self, room: Room):
+        """Gives up the ownership of a room, a worker that still has members takes it over."""
         try:
-            async with websockets.connect(WS_ENDPOINT) as ws:
-                print(f"Connected to {WS_ENDPOINT}")
-                await ws.send(message)
-                print(f"Client sent: {message}")
+            await event_bus.backend.release(room.owner_key, WORKER_ID)
         except Exception as e:
-            print(f"Connection lost: {e}. Reconnecting in {WS_RECONNECT_INTERVAL} seconds...")
-            await asyncio.sleep(WS_RECONNECT_INTERVAL)
+            print(f"Room {room.room_id} ownership error: {e}")
+
+    async def handle_disconnect(self, websocket, websocket_id, room: Room):
+        print(f"Client disconnected: {websocket_id}")
+        disconnected_client = room.clients.get(websocket_id)
+        self.leave(room, websocket_id)
+        print(f"Client removed. Room {room.room_id} clients: {list(room.clients)}")
+        if disconnected_client:
+            self.announce_left(room, disconnected_client)
+
+    def announce_left(self, room: Room, client_obj: dict):
+        client_obj["type"] = "LEFT"
+        self.broadcast(room, client_obj)
+        self.send_presence(room, "PRESENCE_REMOVE", {"id": client_obj["id"]})
 
 ws_service = WebSocketService()
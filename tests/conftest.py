@@ -0,0 +1,110 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+# The services build their OpenAI clients at import time, the tests never call them
+for name in ("OPENAI_API_KEY", "AZURE_OPENAI_API_KEY", "AZURE_EMBEDDING_API_KEY"):
+    os.environ.setdefault(name, "test")
+os.environ.setdefault("AZURE_DEPLOYMENT_NAME", "gpt-4o-mini")
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model answering with its replies in turn, each after `delay` seconds.
+
+    Like the OpenAI API it rejects a request where a tool call is not directly
+    followed by the ToolMessages answering it.
+    """
+
+    replies: list
+    delay: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def next_reply(self, messages) -> AIMessage:
+        for i, message in enumerate(messages):
+            call_ids = {call["id"] for call in getattr(message, "tool_calls", None) or []}
+            answers = messages[i + 1:i + 1 + len(call_ids)]
+            if call_ids and {getattr(answer, "tool_call_id", None) for answer in answers} != call_ids:
+                raise ValueError(f"Tool calls {sorted(call_ids)} must be followed by their tool messages")
+        reply = self.replies[self.calls % len(self.replies)]
+        self.calls += 1
+        return reply.model_copy(update={"id": None})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=self.next_reply(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.delay)
+        return ChatResult(generations=[ChatGeneration(message=self.next_reply(messages))])
+
+
+@pytest.fixture
+def game_master_llm(monkeypatch):
+    """Installs a scripted model as the Game Master LLM of graphs built afterwards."""
+    import app.services.DnDGraph as dnd_graph
+
+    def install(replies: list, delay: float = 0.0) -> ScriptedChatModel:
+        model = ScriptedChatModel(replies=replies, delay=delay)
+        monkeypatch.setattr(dnd_graph, "ChatOpenAI", lambda **kwargs: model)
+        return model
+
+    return install
+
+
+@pytest.fixture
+def summarizer_llm(monkeypatch):
+    """Installs a scripted model as the summarizer used by background compaction."""
+    import app.services.SummarizerNode as summarizer
+
+    def install(replies: list, delay: float = 0.0) -> ScriptedChatModel:
+        model = ScriptedChatModel(replies=replies, delay=delay)
+        monkeypatch.setattr(summarizer, "SUMMARIZER_LLM", model)
+        return model
+
+    return install
+
+
+@pytest.fixture
+def game_service(tmp_path, monkeypatch):
+    """Opens a ChatService whose graph checkpoints to a fresh database under tmp_path.
+
+    Use as `async with game_service() as service:` inside the test's event loop,
+    after installing the Game Master model with `game_master_llm`.
+    """
+    from app.services.ChatService import ChatService
+    from app.services.SqliteService import sqlite_service
+
+    monkeypatch.setattr(sqlite_service, "db_path", str(tmp_path / "checkpoint.db"))
+    monkeypatch.setattr(sqlite_service, "conn", None)
+    monkeypatch.setattr(sqlite_service, "reader_conns", [])
+    monkeypatch.setattr(sqlite_service, "checkpointer", None)
+
+    @asynccontextmanager
+    async def open_service():
+        await sqlite_service.init()
+        try:
+            service = ChatService()
+
+            async def init_character_info(state):
+                return []
+
+            service.init_character_info = init_character_info
+            await service.init()
+            yield service
+        finally:
+            await sqlite_service.close()
+            sqlite_service.checkpointer = None
+
+    return open_service
@@ -0,0 +1,70 @@
+import asyncio
+import sqlite3
+from app.services.CheckpointRetention import CheckpointRetention
+
+
+def make_retention(convert_auto_vacuum: bool) -> CheckpointRetention:
+    return CheckpointRetention(
+        keep_last=1,
+        keep_turns=0,
+        batch_size=10,
+        vacuum_pages=100,
+        interval_seconds=3600,
+        convert_auto_vacuum=convert_auto_vacuum,
+    )
+
+
+def create_legacy_database(path: str) -> None:
+    """A database made before the checkpointer asked for incremental auto-vacuum."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE legacy (x)")
+    conn.commit()
+    conn.close()
+
+
+def count_passes(retention: CheckpointRetention, monkeypatch) -> list:
+    passes = []
+
+    async def prune_once():
+        passes.append(1)
+
+    monkeypatch.setattr(retention, "prune_once", prune_once)
+    return passes
+
+
+def test_legacy_database_is_pruned_without_conversion_by_default(game_service, tmp_path, monkeypatch):
+    create_legacy_database(str(tmp_path / "checkpoint.db"))
+    retention = make_retention(convert_auto_vacuum=False)
+    passes = count_passes(retention, monkeypatch)
+
+    async def run():
+        async with game_service():
+            await retention.enable_incremental_vacuum()
+            assert await retention.pragma("auto_vacuum") == 0
+            retention.start()
+            await asyncio.sleep(0.1)
+            await retention.stop()
+
+    asyncio.run(run())
+    assert passes == [1]
+
+
+def test_failed_conversion_keeps_pruning(game_service, tmp_path, monkeypatch):
+    create_legacy_database(str(tmp_path / "checkpoint.db"))
+    retention = make_retention(convert_auto_vacuum=True)
+    passes = count_passes(retention, monkeypatch)
+
+    async def full_disk():
+        raise sqlite3.OperationalError("database or disk is full")
+
+    monkeypatch.setattr(retention, "enable_incremental_vacuum", full_disk)
+
+    async def run():
+        async with game_service():
+            retention.start()
+            await asyncio.sleep(0.1)
+            assert not retention.task.done()
+            await retention.stop()
+
+    asyncio.run(run())
+    assert passes == [1]
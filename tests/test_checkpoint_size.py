@@ -0,0 +1,37 @@
+import asyncio
+from langchain_core.messages import AIMessage
+
+TURNS = 20
+
+
+async def stored_bytes(conn) -> int:
+    total = 0
+    for query in (
+        "SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints",
+        "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes",
+        "SELECT COALESCE(SUM(LENGTH(value)), 0) FROM message_log",
+    ):
+        async with conn.execute(query) as cur:
+            total += (await cur.fetchone())[0]
+    return total
+
+
+def test_bytes_written_per_turn_do_not_grow_with_history(game_master_llm, game_service):
+    game_master_llm([AIMessage("Goblin lao ra từ bụi rậm và vung dao về phía bạn.")])
+
+    async def run():
+        async with game_service() as service:
+            conn = service.dnd_graph.checkpointer.conn
+            per_turn = []
+            for turn in range(TURNS):
+                before = await stored_bytes(conn)
+                await service.chat(f"Tôi tấn công goblin lần {turn}", "table")
+                per_turn.append(await stored_bytes(conn) - before)
+            state = await service.dnd_graph.aget_state({"configurable": {"thread_id": "table"}})
+            return per_turn, state
+
+    per_turn, state = asyncio.run(run())
+
+    assert len(state.values["messages"]) == 1 + 2 * TURNS
+    # The first turn also stores the system prompt, every later one only its own two messages
+    assert max(per_turn[2:]) <= per_turn[1] * 1.1
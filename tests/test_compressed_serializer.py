@@ -0,0 +1,88 @@
+import random
+import threading
+import zstandard
+from app.services.CompressedSerializer import ZSTD_SUFFIX, ZstdSerializer
+
+WORDS = "rồng goblin hang động kiếm phép thuật Phandalin Gundren Sildar ánh sáng bạn thấy".split()
+
+
+def payloads(count, seed):
+    rng = random.Random(seed)
+    return [
+        {"type": "ai", "content": " ".join(rng.choice(WORDS) for _ in range(80)), "turn": i}
+        for i in range(count)
+    ]
+
+
+def make(dict_path):
+    return ZstdSerializer(str(dict_path), dict_size=4096, train_samples=40)
+
+
+def wait_trained(serializer):
+    training = serializer._training
+    if training is not None:
+        training.join()
+
+
+def test_workers_share_one_dictionary(tmp_path):
+    dict_path = tmp_path / "checkpoint.db.dict"
+    worker_a, worker_b = make(dict_path), make(dict_path)
+
+    for obj in payloads(40, seed=1):
+        worker_a.dumps_typed(obj)
+    wait_trained(worker_a)
+    for obj in payloads(40, seed=2):
+        worker_b.dumps_typed(obj)
+    wait_trained(worker_b)
+
+    assert worker_a.dictionary is not None
+    assert worker_b.dictionary.dict_id() == worker_a.dictionary.dict_id()
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(
+        ["checkpoint.db.dict", f"checkpoint.db.{worker_a.dictionary.dict_id()}.dict"]
+    )
+
+    written = [(obj, worker.dumps_typed(obj)) for worker in (worker_a, worker_b) for obj in payloads(5, seed=3)]
+    assert all(typ.endswith(ZSTD_SUFFIX) for _, (typ, _) in written)
+    restarted = make(dict_path)
+    for obj, typed in written:
+        assert worker_a.loads_typed(typed) == obj
+        assert worker_b.loads_typed(typed) == obj
+        assert restarted.loads_typed(typed) == obj
+
+
+def test_frames_of_an_older_dictionary_stay_readable(tmp_path):
+    dict_path = tmp_path / "checkpoint.db.dict"
+    old = make(dict_path)
+    for obj in payloads(40, seed=1):
+        old.dumps_typed(obj)
+    wait_trained(old)
+    obj = payloads(1, seed=4)[0]
+    typed = old.dumps_typed(obj)
+
+    # The shared file is replaced, e.g. by hand after retraining
+    dict_path.unlink()
+    new = make(dict_path)
+    for sample in payloads(40, seed=5):
+        new.dumps_typed(sample)
+    wait_trained(new)
+
+    assert new.dictionary.dict_id() != old.dictionary.dict_id()
+    assert make(dict_path).loads_typed(typed) == obj
+
+
+def test_dictionary_is_trained_off_the_calling_thread(tmp_path, monkeypatch):
+    trained_on = []
+    train_dictionary = zstandard.train_dictionary
+
+    def recording_train_dictionary(*args, **kwargs):
+        trained_on.append(threading.current_thread())
+        return train_dictionary(*args, **kwargs)
+
+    monkeypatch.setattr(zstandard, "train_dictionary", recording_train_dictionary)
+    serializer = make(tmp_path / "checkpoint.db.dict")
+    for obj in payloads(40, seed=1):
+        serializer.dumps_typed(obj)
+    wait_trained(serializer)
+
+    assert trained_on and trained_on[0] is not threading.current_thread()
+    assert serializer.dictionary is not None
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import subprocess
+import sys
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+import app.services.ChatService as chat_service
+from app.services.ToolNode import AsyncToolNode, repair_tool_calls
+
+# Plays one full turn, then kills the process inside the second one, right
+# after its combat tool ran and while the Game Master is answering.
+CRASHING_GAME = """
+import asyncio, os, sys
+sys.path.insert(0, os.path.join(os.getcwd(), "tests"))
+from conftest import ScriptedChatModel
+from langchain_core.messages import AIMessage
+import app.services.DnDGraph as dnd_graph
+from app.services.ChatService import CFG, ChatService
+from app.services.SqliteService import sqlite_service
+
+class CrashingChatModel(ScriptedChatModel):
+    async def _agenerate(self, *args, **kwargs):
+        if self.calls == 3:
+            os._exit(1)
+        return await super()._agenerate(*args, **kwargs)
+
+def combat_call(call_id):
+    args = {"damage": "1", "hit_status": "hit", "description": "chém"}
+    return AIMessage("", tool_calls=[{"name": "combat_tool", "args": args, "id": call_id}])
+
+model = CrashingChatModel(replies=[combat_call("first"), AIMessage("Goblin ngã xuống."), combat_call("second")])
+dnd_graph.ChatOpenAI = lambda **kwargs: model
+CFG.checkpoint_durability = sys.argv[1]
+sqlite_service.db_path = sys.argv[2]
+
+async def main():
+    await sqlite_service.init()
+    service = ChatService()
+    async def init_character_info(state):
+        return []
+    service.init_character_info = init_character_info
+    await service.init()
+    await service.chat("Tôi tấn công goblin", "table")
+    await service.chat("Tôi tấn công goblin thứ hai", "table")
+
+asyncio.run(main())
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIRST_TURN = [SystemMessage, HumanMessage, AIMessage, ToolMessage, AIMessage]
+CRASHED_TURN = [HumanMessage, AIMessage, ToolMessage]
+
+
+def crash_mid_turn(durability: str, db_path: str) -> None:
+    result = subprocess.run([sys.executable, "-c", CRASHING_GAME, durability, db_path], cwd=ROOT)
+    assert result.returncode == 1
+
+
+def recover_and_play(game_master_llm, game_service):
+    """Reads the thread the crash left behind, then plays the players' next turn on it."""
+    game_master_llm([AIMessage("Goblin ngã xuống.")])
+    config = {"configurable": {"thread_id": "table"}}
+
+    async def run():
+        async with game_service() as service:
+            state = await service.dnd_graph.aget_state(config)
+            reply = await service.chat("Tôi nhìn quanh", "table")
+            return state, reply, await service.dnd_graph.aget_state(config)
+
+    return asyncio.run(run())
+
+
+def message_types(state) -> list[type]:
+    return [type(message) for message in state.values["messages"]]
+
+
+def test_sync_durability_keeps_every_finished_step(game_master_llm, game_service, tmp_path):
+    crash_mid_turn("sync", str(tmp_path / "checkpoint.db"))
+    state, reply, after = recover_and_play(game_master_llm, game_service)
+
+    # The tool result is saved, the turn resumes at the Game Master's answer
+    assert message_types(state) == FIRST_TURN + CRASHED_TURN
+    assert state.next == ("main_chat_node",)
+    assert reply == "Goblin ngã xuống."
+
+
+def test_async_durability_loses_only_steps_still_being_saved(game_master_llm, game_service, tmp_path):
+    crash_mid_turn("async", str(tmp_path / "checkpoint.db"))
+    state, reply, after = recover_and_play(game_master_llm, game_service)
+
+    # Whatever steps of the crashed turn were still queued for saving are gone,
+    # how many depends on timing. The last finished turn is always kept.
+    kept = message_types(state)
+    assert len(kept) >= len(FIRST_TURN)
+    assert kept == (FIRST_TURN + CRASHED_TURN)[:len(kept)]
+    if kept[-1] is AIMessage and len(kept) > len(FIRST_TURN):
+        # The tool step was lost, the thread ends on a tool call nothing answered
+        assert state.values["messages"][-1].tool_calls[0]["id"] == "second"
+        # The next turn answers it with an error before the players' input
+        repaired = after.values["messages"][len(kept)]
+        assert isinstance(repaired, ToolMessage) and repaired.status == "error"
+    assert reply == "Goblin ngã xuống."
+
+
+def test_exit_durability_loses_the_whole_turn(game_master_llm, game_service, tmp_path):
+    crash_mid_turn("exit", str(tmp_path / "checkpoint.db"))
+    state, reply, after = recover_and_play(game_master_llm, game_service)
+
+    # Only the last finished turn survives, the players' input has to be sent again
+    assert message_types(state) == FIRST_TURN
+    assert state.next == ()
+    assert reply == "Goblin ngã xuống."
+
+
+def test_turn_cancelled_during_a_tool_does_not_break_the_thread(game_master_llm, game_service, monkeypatch):
+    monkeypatch.setattr(chat_service.CFG, "checkpoint_durability", "sync")
+
+    async def slow_tool(self, tool_call):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(AsyncToolNode, "run_tool", slow_tool)
+    game_master_llm([
+        AIMessage("", tool_calls=[{"name": "combat_tool", "args": {"damage": "1", "hit_status": "hit", "description": "chém"}, "id": "left"}]),
+        AIMessage("Goblin ngã xuống."),
+    ])
+    config = {"configurable": {"thread_id": "table"}}
+
+    async def run():
+        async with game_service() as service:
+            tool_started = asyncio.Event()
+
+            async def play():
+                async for event in service.stream_chat("Tôi tấn công goblin", "table"):
+                    if event["event"] == "tool_start":
+                        tool_started.set()
+
+            # The players leave while the tool runs, which cancels the turn
+            turn = asyncio.create_task(play())
+            await tool_started.wait()
+            await asyncio.sleep(0.05)
+            turn.cancel()
+            try:
+                await turn
+            except asyncio.CancelledError:
+                pass
+            state = await service.dnd_graph.aget_state(config)
+            reply = await service.chat("Tôi nhìn quanh", "table")
+            return state, reply, await service.dnd_graph.aget_state(config)
+
+    state, reply, after = asyncio.run(run())
+
+    # The step with the tool call was saved, its result never was
+    assert state.next == ("tools_node",)
+    assert reply == "Goblin ngã xuống."
+    answer = after.values["messages"][3]
+    assert isinstance(answer, ToolMessage) and answer.tool_call_id == "left" and answer.status == "error"
+    assert message_types(after) == FIRST_TURN[:3] + [ToolMessage, HumanMessage, AIMessage]
+
+
+def test_older_unanswered_tool_call_is_removed_with_its_partial_results():
+    calls = [{"name": "combat_tool", "args": {}, "id": "a"}, {"name": "monster_query_tool", "args": {}, "id": "b"}]
+    messages = [
+        HumanMessage("Tôi tấn công goblin", id="h1"),
+        AIMessage("", tool_calls=calls, id="ai"),
+        ToolMessage("Done", tool_call_id="a", id="t1"),
+        HumanMessage("Tôi nhìn quanh", id="h2"),
+    ]
+
+    updates, token_delta = repair_tool_calls(messages)
+
+    # Nothing can be inserted after the call any more, so the call goes
+    assert [(type(m), m.id) for m in updates] == [(RemoveMessage, "ai"), (RemoveMessage, "t1")]
+    assert token_delta < 0
@@ -0,0 +1,28 @@
+import asyncio
+import time
+from langchain_core.messages import AIMessage, HumanMessage
+from app.services.DnDGraph import build_graph
+
+LLM_LATENCY = 0.5
+SESSIONS = 10
+
+
+def test_concurrent_sessions_wait_on_the_llm_together(game_master_llm):
+    model = game_master_llm([AIMessage("Bạn bước vào quán rượu.")], delay=LLM_LATENCY)
+    graph = build_graph()
+
+    async def turn(session_id):
+        config = {"configurable": {"thread_id": session_id}}
+        return await graph.ainvoke({"messages": [HumanMessage("Tôi mở cửa")], "token_count": 0}, config)
+
+    async def run():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(turn(f"session-{i}") for i in range(SESSIONS)))
+        return time.perf_counter() - start, results
+
+    elapsed, results = asyncio.run(run())
+
+    assert model.calls == SESSIONS
+    assert all(result["messages"][-1].content == "Bạn bước vào quán rượu." for result in results)
+    # One LLM latency for all of them, not one per session
+    assert elapsed < 2 * LLM_LATENCY
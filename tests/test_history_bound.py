@@ -0,0 +1,36 @@
+import asyncio
+from langchain_core.messages import AIMessage, ToolMessage
+import app.services.ChatService as chat_service
+import app.services.SummarizerNode as summarizer
+
+TURNS = 500
+COMBAT_CALL = {"name": "combat_tool", "args": {"damage": "1", "hit_status": "hit", "description": "chém"}, "id": "call"}
+
+
+def test_messages_channel_stays_bounded_over_long_session(game_master_llm, summarizer_llm, game_service, monkeypatch):
+    game_master_llm([
+        AIMessage("", tool_calls=[COMBAT_CALL]),
+        AIMessage("Goblin lùi lại một bước rồi gầm gừ."),
+    ])
+    monkeypatch.setattr(chat_service, "TOKEN_LIMIT", 150)
+    summarizer_llm([AIMessage("Nhóm đang đánh goblin.")])
+    config = {"configurable": {"thread_id": "table"}}
+
+    async def run():
+        async with game_service() as service:
+            longest = 0
+            for turn in range(TURNS):
+                await service.chat(f"Tôi tấn công goblin lần {turn}", "table")
+                state = await service.dnd_graph.aget_state(config)
+                longest = max(longest, len(state.values["messages"]))
+            await service.sessions.sessions["table"].compaction
+            return longest, await service.dnd_graph.aget_state(config)
+
+    longest, state = asyncio.run(run())
+    messages = state.values["messages"]
+
+    # The summarizer keeps the last MESSAGES_TO_KEEP plus whatever turns landed while it ran
+    assert longest < 4 * summarizer.MESSAGES_TO_KEEP
+    assert state.values["summary"] == "Nhóm đang đánh goblin."
+    assert not isinstance(messages[1], ToolMessage)
+    assert state.values["token_count"] == summarizer.count_messages_tokens(messages) + summarizer.count_text_tokens(state.values["summary"])
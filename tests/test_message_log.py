@@ -0,0 +1,89 @@
+import asyncio
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+from app.services.SqliteService import SqliteService
+
+
+def build_graph(checkpointer):
+    def game_master(state: MessagesState):
+        return {"messages": [AIMessage(f"r{state['messages'][-1].content}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("game_master", game_master)
+    builder.add_edge(START, "game_master")
+    builder.add_edge("game_master", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+async def open_worker(db_path):
+    service = SqliteService()
+    service.db_path = str(db_path)
+    await service.init()
+    return service, build_graph(service.checkpointer)
+
+
+def contents(state):
+    return [m.content for m in state.values["messages"]]
+
+
+def test_two_processes_writing_one_thread(tmp_path):
+    async def run():
+        config = {"configurable": {"thread_id": "room"}}
+        service_a, graph_a = await open_worker(tmp_path / "checkpoint.db")
+        service_b, graph_b = await open_worker(tmp_path / "checkpoint.db")
+        written = {}
+
+        async def remember(graph):
+            async for state in graph.aget_state_history(config):
+                written.setdefault(state.config["configurable"]["checkpoint_id"], contents(state))
+
+        try:
+            await graph_a.ainvoke({"messages": [HumanMessage("t1")]}, config)
+            await remember(graph_a)
+            await graph_b.ainvoke({"messages": [HumanMessage("t2")]}, config)
+            await graph_b.ainvoke({"messages": [HumanMessage("t3")]}, config)
+            t2 = next(m for m in (await graph_b.aget_state(config)).values["messages"] if m.content == "t2")
+            await graph_b.aupdate_state(config, {"messages": [RemoveMessage(id=t2.id)]})
+            await remember(graph_b)
+            await graph_a.ainvoke({"messages": [HumanMessage("t4")]}, config)
+            await remember(graph_a)
+            await graph_b.ainvoke({"messages": [HumanMessage("t5")]}, config)
+            await remember(graph_b)
+
+            expected = ["t1", "rt1", "rt2", "t3", "rt3", "t4", "rt4", "t5", "rt5"]
+            assert contents(await graph_a.aget_state(config)) == expected
+            assert contents(await graph_b.aget_state(config)) == expected
+            # Older checkpoints still rebuild the conversation they were written with
+            async for state in graph_a.aget_state_history(config):
+                assert contents(state) == written[state.config["configurable"]["checkpoint_id"]]
+        finally:
+            await service_a.close()
+            await service_b.close()
+
+    asyncio.run(run())
+
+
+def test_loaded_messages_are_not_encoded_again(tmp_path, monkeypatch):
+    async def run():
+        config = {"configurable": {"thread_id": "solo"}}
+        service, graph = await open_worker(tmp_path / "checkpoint.db")
+        encoded = []
+        dumps_typed = service.checkpointer.jsonplus_serde.dumps_typed
+
+        def counting_dumps_typed(obj):
+            encoded.append(obj)
+            return dumps_typed(obj)
+
+        monkeypatch.setattr(service.checkpointer.jsonplus_serde, "dumps_typed", counting_dumps_typed)
+        try:
+            per_turn = []
+            for turn in range(6):
+                before = len(encoded)
+                await graph.ainvoke({"messages": [HumanMessage(f"t{turn}")]}, config)
+                per_turn.append(len(encoded) - before)
+            # The human message and the reply of each turn, not the whole history again
+            assert max(per_turn[1:]) <= 4
+        finally:
+            await service.close()
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import app.services.WebsocketService as websocket_service
+from app.services.RateLimiter import RateLimit, allow
+
+
+class FakeWebSocket:
+    scope = {}
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def receive(self):
+        if self.frames:
+            return {"type": "websocket.receive", "text": self.frames.pop(0)}
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send_text(self, text):
+        await asyncio.sleep(3600)
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+def test_burst_then_refill():
+    limit = RateLimit(messages_per_second=10, message_burst=2, bytes_per_second=1000, byte_burst=1000)
+    assert allow([limit], 10) == 0
+    assert allow([limit], 10) == 0
+    assert allow([limit], 10) > 0
+    limit.messages.updated -= 0.1
+    assert allow([limit], 10) == 0
+
+
+def test_rejected_frame_is_not_charged():
+    connection = RateLimit(messages_per_second=0, message_burst=5, bytes_per_second=0, byte_burst=100)
+    room = RateLimit(messages_per_second=1, message_burst=1, bytes_per_second=1, byte_burst=100)
+    assert allow([connection, room], 10) == 0
+    assert allow([connection, room], 10) > 0
+    assert connection.messages.tokens == 4
+
+
+def test_text_frames_are_charged_in_bytes(monkeypatch):
+    monkeypatch.setattr(websocket_service.CFG, "ws_rate_limit_connection", {
+        "messages_per_second": 0, "message_burst": 100, "bytes_per_second": 0, "byte_burst": 400,
+    })
+    # About 140 characters but 340 bytes of UTF-8, the second frame is over the byte burst
+    message = "ắ" * 100
+    frames = [json.dumps({"user": "A", "type": "CHAT", "message": message}, ensure_ascii=False)] * 2
+
+    async def run():
+        service = websocket_service.WebSocketService()
+        websocket = FakeWebSocket(frames)
+        client = await service.handle_connect(websocket, "table")
+        await service.handle_receive(websocket, client, None)
+        # The socket is gone, what was sent to it is still on its send queue
+        queue = client["queue"]
+        return [json.loads(queue.get_nowait()) for _ in range(queue.qsize())]
+
+    sent = asyncio.run(run())
+    assert [frame["type"] for frame in sent] == ["CHAT", "THROTTLED"]
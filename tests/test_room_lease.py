@@ -0,0 +1,84 @@
+import asyncio
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import app.controllers.ChatController as chat_controller
+from app.models.ChatRequest import ChatRequest
+from app.services.BroadcastBackend import WORKER_ID, InMemoryBroadcastBackend
+from app.services.EventBus import room_owner_key
+
+
+def make_client(monkeypatch):
+    backend = InMemoryBroadcastBackend()
+    monkeypatch.setattr(chat_controller.event_bus, "backend", backend)
+    held = []
+
+    async def chat(message, session_id):
+        # The turn runs while this worker holds the game's lease
+        held.append(backend.leases[room_owner_key(session_id)][0])
+        return f"reply to {message}"
+
+    monkeypatch.setattr(chat_controller.openai_service, "chat", chat)
+    api = FastAPI()
+    api.include_router(chat_controller.router)
+    return TestClient(api), backend, held
+
+
+def test_rest_turn_holds_the_room_lease(monkeypatch):
+    client, backend, held = make_client(monkeypatch)
+
+    response = client.post("/chat/message", json={"message": "hi", "session_id": "table"})
+
+    assert response.status_code == 200
+    assert held == [WORKER_ID]
+    # Released after the turn, no websocket room on this worker needs it
+    assert room_owner_key("table") not in backend.leases
+
+
+def test_rest_turn_refused_while_another_worker_plays_the_room(monkeypatch):
+    client, backend, held = make_client(monkeypatch)
+    asyncio.run(backend.claim(room_owner_key("table"), "other-worker", 60_000))
+
+    response = client.post("/chat/message", json={"message": "hi", "session_id": "table"})
+
+    assert response.status_code == 409
+    assert held == []
+    assert backend.leases[room_owner_key("table")][0] == "other-worker"
+
+
+def test_rest_turn_renews_the_lease_while_it_runs(monkeypatch):
+    client, backend, held = make_client(monkeypatch)
+    monkeypatch.setattr(chat_controller.CFG, "ws_broadcast_lease_seconds", 0.3)
+    taken_over = []
+
+    async def slow_chat(message, session_id):
+        # Twice the lease, another worker tries to take the game over halfway
+        await asyncio.sleep(0.6)
+        taken_over.append(await backend.claim(room_owner_key(session_id), "other-worker", 60_000))
+        return "reply"
+
+    monkeypatch.setattr(chat_controller.openai_service, "chat", slow_chat)
+
+    response = client.post("/chat/message", json={"message": "hi", "session_id": "table"})
+
+    assert response.status_code == 200
+    assert taken_over == [False]
+
+
+def test_stream_never_read_does_not_hold_the_lease(monkeypatch):
+    client, backend, held = make_client(monkeypatch)
+
+    # The client goes away before the body is streamed
+    asyncio.run(chat_controller.send_message_stream(ChatRequest(message="hi", session_id="table")))
+
+    assert room_owner_key("table") not in backend.leases
+
+
+def test_stream_refused_while_another_worker_plays_the_room(monkeypatch):
+    client, backend, held = make_client(monkeypatch)
+    asyncio.run(backend.claim(room_owner_key("table"), "other-worker", 60_000))
+
+    response = client.post("/chat/message/stream", json={"message": "hi", "session_id": "table"})
+
+    assert response.text.startswith("event: error\n")
+    assert '"status": 409' in response.text
+    assert backend.leases[room_owner_key("table")][0] == "other-worker"
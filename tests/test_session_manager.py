@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+from langchain_core.messages import AIMessage
+from app.services.ChatService import ChatService
+
+
+class FlakyGraph:
+    """Graph whose first turn fails, recording how many turns run at once."""
+
+    def __init__(self):
+        self.turns = 0
+        self.running = 0
+        self.max_running = 0
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values={})
+
+    async def astream(self, graph_input, config, stream_mode, durability):
+        self.turns += 1
+        turn = self.turns
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(0.05)
+            if turn == 1:
+                raise RuntimeError("LLM unavailable")
+            yield "updates", {"main_chat_node": {"messages": [AIMessage(f"reply {turn}")]}}
+        finally:
+            self.running -= 1
+
+
+def test_failed_turn_keeps_one_session_per_thread():
+    async def run():
+        service = ChatService()
+        service.dnd_graph = FlakyGraph()
+
+        async def init_character_info(state):
+            return ["Fighter"]
+
+        service.init_character_info = init_character_info
+
+        first = asyncio.create_task(service.chat("first", "table"))
+        await asyncio.sleep(0.01)
+        # Queued on the session lock while the first turn runs
+        queued = asyncio.create_task(service.chat("queued", "table"))
+        session = service.sessions.sessions["table"]
+        try:
+            await first
+        except RuntimeError:
+            pass
+        # Arrives after the failure, while the queued turn runs
+        late = asyncio.create_task(service.chat("late", "table"))
+        replies = await asyncio.gather(queued, late)
+
+        assert replies == ["reply 2", "reply 3"]
+        assert service.dnd_graph.max_running == 1
+        assert service.sessions.sessions["table"] is session
+        assert not session.stale
+
+    asyncio.run(run())
+
+
+class BlockingGraph:
+    """Graph whose turns wait for `release`, recording how many turns run at once per thread."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.running: dict[str, int] = {}
+        self.max_running: dict[str, int] = {}
+
+    async def aget_state(self, config):
+        return SimpleNamespace(values={})
+
+    async def astream(self, graph_input, config, stream_mode, durability):
+        thread_id = config["configurable"]["thread_id"]
+        self.running[thread_id] = self.running.get(thread_id, 0) + 1
+        self.max_running[thread_id] = max(self.max_running.get(thread_id, 0), self.running[thread_id])
+        try:
+            await self.release.wait()
+            yield "updates", {"main_chat_node": {"messages": [AIMessage(f"reply on {thread_id}")]}}
+        finally:
+            self.running[thread_id] -= 1
+
+
+def test_full_cache_of_busy_sessions_keeps_the_one_handed_out():
+    async def run():
+        service = ChatService()
+        service.dnd_graph = BlockingGraph()
+        service.sessions.max_sessions = 2
+
+        async def init_character_info(state):
+            return ["Fighter"]
+
+        service.init_character_info = init_character_info
+
+        turns = [asyncio.create_task(service.chat("hit", thread_id)) for thread_id in ("t1", "t2")]
+        await asyncio.sleep(0.01)
+        # t1 and t2 are busy, both turns on t3 must share its session
+        turns += [asyncio.create_task(service.chat("hit", "t3")) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        assert len(service.sessions.sessions) == 3
+        service.dnd_graph.release.set()
+        await asyncio.gather(*turns)
+
+        assert service.dnd_graph.max_running == {"t1": 1, "t2": 1, "t3": 1}
+        # Once the turns are over the cache shrinks back on the next access
+        await service.sessions.get("t3", service.dnd_graph)
+        assert len(service.sessions.sessions) == 2
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+import asyncio
+import json
+import app.services.WebsocketService as websocket_service
+
+
+class StalledWebSocket:
+    """A socket whose client never reads, its first frame stays in flight forever."""
+
+    scope = {}
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        await asyncio.sleep(3600)
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+class RecordingWebSocket(StalledWebSocket):
+    """A socket whose client reads every frame at once."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, text):
+        self.sent.append(json.loads(text))
+
+
+def test_dropping_a_slow_member_keeps_frames_in_seq_order(monkeypatch):
+    monkeypatch.setattr(websocket_service.CFG, "ws_send_queue_size", 4)
+
+    async def run():
+        service = websocket_service.WebSocketService()
+        # The slow member joined first, the others are delivered to after it
+        slow = await service.handle_connect(StalledWebSocket(), "table")
+        sockets = [RecordingWebSocket() for _ in range(2)]
+        for websocket in sockets:
+            await service.handle_connect(websocket, "table")
+        await asyncio.sleep(0)
+        while not slow["queue"].full():
+            slow["queue"].put_nowait("{}")
+
+        service.deliver(slow["room"], {"id": "GAME_MASTER", "user": "GAME_MASTER", "type": "CHAT", "message": "Goblin lao tới."})
+        await asyncio.sleep(0.01)
+        assert slow["id"] not in slow["room"].clients
+        return [websocket.sent for websocket in sockets]
+
+    for frames in asyncio.run(run()):
+        assert [frame["type"] for frame in frames] == ["CHAT", "LEFT", "PRESENCE_REMOVE"]
+        seqs = [frame["seq"] for frame in frames]
+        assert seqs == sorted(seqs)